@@ -0,0 +1,173 @@
+"""Measure what opening database connections costs each request.
+
+Runs the same simulated requests against the database in DATABASE_URL
+with three connection settings side by side:
+
+    fresh       CONN_MAX_AGE=0, a new connection for every request
+    persistent  CONN_MAX_AGE=600 with health checks
+    pooled      psycopg's connection pool (PostgreSQL only)
+
+Each request sends request_started and request_finished, as Django's
+handlers do, so connections are closed, kept or returned to the pool
+exactly as they would be in a worker, and runs --queries queries.
+
+    DATABASE_URL=postgres://planner@localhost/planner python benchmarks/db_connections.py
+    python benchmarks/db_connections.py --thread-per-request --output asgi.json
+
+--thread-per-request runs every request in a new thread, as the async
+views do under ASGI, where persistent connections are never reused.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'study_planner.settings')
+
+MODES = ['fresh', 'persistent', 'pooled']
+
+
+def setup_django(pool_size):
+    """Add one database alias per mode, all pointing at the default database"""
+    from django.conf import settings
+    default = {
+        key: value for key, value in settings.DATABASES['default'].items()
+        if key not in ('CONN_MAX_AGE', 'OPTIONS')
+    }
+    options = {
+        key: value for key, value in settings.DATABASES['default'].get('OPTIONS', {}).items()
+        if key != 'pool'
+    }
+    settings.DATABASES['fresh'] = {**default, 'OPTIONS': options, 'CONN_MAX_AGE': 0}
+    settings.DATABASES['persistent'] = {
+        **default, 'OPTIONS': options, 'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True,
+    }
+    if default['ENGINE'] == 'django.db.backends.postgresql':
+        settings.DATABASES['pooled'] = {
+            **default,
+            'OPTIONS': {**options, 'pool': {'min_size': 1, 'max_size': pool_size}},
+            'CONN_MAX_AGE': 0,
+        }
+
+    import django
+    django.setup()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_mode(alias, args):
+    from django.core.signals import request_finished, request_started
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    connection = connections[alias]
+    sql = 'SELECT pg_backend_pid()' if connection.vendor == 'postgresql' else 'SELECT 1'
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        if connection.alias == alias:
+            opened.append(1)
+
+    def request():
+        request_started.send(sender=None)
+        try:
+            with connections[alias].cursor() as cursor:
+                for _ in range(args.queries):
+                    cursor.execute(sql)
+                    cursor.fetchone()
+        finally:
+            request_finished.send(sender=None)
+
+    connection_created.connect(count_connection)
+    try:
+        timings = []
+        for index in range(args.warmup + args.requests):
+            started = time.perf_counter()
+            if args.thread_per_request:
+                thread = threading.Thread(target=request)
+                thread.start()
+                thread.join()
+            else:
+                request()
+            if index >= args.warmup:
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        connection_created.disconnect(count_connection)
+        connections[alias].close()
+
+    return {
+        'requests': len(timings),
+        # Taking a pooled connection also sends connection_created
+        'connections_created': len(opened),
+        'ms_median': round(statistics.median(timings), 3),
+        'ms_p95': round(percentile(timings, 0.95), 3),
+        'ms_mean': round(statistics.mean(timings), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1000, help="Requests per mode")
+    parser.add_argument('--warmup', type=int, default=50, help="Untimed requests before each mode")
+    parser.add_argument('--queries', type=int, default=3, help="Queries per request")
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--thread-per-request', action='store_true',
+                        help="Run every request in a new thread, as under ASGI")
+    parser.add_argument('--output', default='-', help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+
+    setup_django(args.pool_size)
+
+    import django
+    from django.conf import settings
+    from django.db import connections
+
+    modes = [mode for mode in MODES if mode in settings.DATABASES]
+    vendor = connections['fresh'].vendor
+    if 'pooled' not in modes:
+        print(f"Connection pooling needs PostgreSQL, skipping it on {vendor}", file=sys.stderr)
+
+    results = {}
+    for mode in modes:
+        print(f"Running {args.requests} requests with {mode} connections ...", file=sys.stderr)
+        results[mode] = run_mode(mode, args)
+
+    fresh = results['fresh']['ms_median']
+    print("\nmode          median ms    p95 ms   connections   saved per request", file=sys.stderr)
+    for mode, result in results.items():
+        print(
+            f"{mode:12} {result['ms_median']:10.3f} {result['ms_p95']:9.3f} "
+            f"{result['connections_created']:13} {fresh - result['ms_median']:15.3f} ms",
+            file=sys.stderr
+        )
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': vendor,
+            'machine': platform.machine(),
+        },
+        'modes': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
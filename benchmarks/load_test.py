@@ -0,0 +1,279 @@
+"""Load test the read-heavy endpoints of a running deployment.
+
+Seeds a load test user with tasks and study sessions into the configured
+database, then has --concurrency clients request the calendar feed, the
+dashboard and the upcoming tasks API for --duration seconds and writes
+throughput and latency percentiles as JSON.
+
+To compare the sync and async deployments, start each with the same workers
+on the same cores and run the test against it:
+
+    taskset -c 0-1 gunicorn study_planner.wsgi:application --workers 2 &
+    python benchmarks/load_test.py --concurrency 64 --output wsgi.json
+    taskset -c 0-1 uvicorn study_planner.asgi:application --workers 2 &
+    python benchmarks/load_test.py --concurrency 64 --output asgi.json --baseline wsgi.json
+
+Run the clients on other cores than the server, or on another machine
+sharing the database, so they do not compete with it for CPU.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'study_planner.settings')
+
+USERNAME = 'loadtest'
+ENDPOINTS = ['calendar', 'dashboard', 'upcoming']
+# Summary metrics compared against --baseline, and whether lower is better
+COMPARED_METRICS = {
+    'requests_per_second': False,
+    'latency_ms_median': True,
+    'latency_ms_p95': True,
+    'latency_ms_p99': True,
+    'errors': True,
+}
+
+
+def parse_mix(value):
+    """'calendar:3,dashboard:1' -> {'calendar': 3.0, 'dashboard': 1.0}"""
+    try:
+        weights = {
+            name: float(weight)
+            for name, weight in (item.split(':') for item in value.split(','))
+        }
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid mix: {value}")
+    if set(weights) - set(ENDPOINTS) or min(weights.values()) < 0 or not sum(weights.values()):
+        raise argparse.ArgumentTypeError(f"Invalid mix: {value}")
+    return weights
+
+
+def seed(args, now):
+    """Create the load test user and their data once; return a logged in session key"""
+    from importlib import import_module
+
+    from django.conf import settings
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from planner.models import StudySession, Task, UserProfile
+
+    user, created = User.objects.get_or_create(
+        username=USERNAME, defaults={'email': f'{USERNAME}@example.com'}
+    )
+    UserProfile.objects.get_or_create(user=user)
+    if created:
+        rnd = random.Random(args.seed)
+        Task.objects.bulk_create(
+            Task(
+                user=user,
+                title=f"Load test task {index}",
+                due_date=now + timedelta(seconds=rnd.uniform(0, args.days * 86400)),
+                priority=rnd.randint(1, 4),
+                estimated_duration=rnd.choice([30, 60, 90, 120]),
+            )
+            for index in range(args.tasks)
+        )
+        sessions = []
+        for day in range(args.days):
+            for slot in range(args.sessions_per_day):
+                start = now.replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(
+                    days=day, hours=slot * 2
+                )
+                sessions.append(StudySession(
+                    user=user, title="Load test session", start_time=start,
+                    end_time=start + timedelta(minutes=50),
+                ))
+        StudySession.objects.bulk_create(sessions)
+
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key
+
+
+def request_paths(args, now):
+    from django.urls import reverse
+
+    calendar_query = urlencode({
+        'start': now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat(),
+        'end': (now + timedelta(days=args.days)).isoformat(),
+    })
+    return {
+        'calendar': f"{reverse('calendar_events')}?{calendar_query}",
+        'dashboard': reverse('dashboard'),
+        'upcoming': reverse('api_upcoming_tasks'),
+    }
+
+
+class Client(threading.Thread):
+    """Sends requests back to back over one keep-alive connection"""
+
+    def __init__(self, url, paths, headers, mix, deadline, warmup_until, seed):
+        super().__init__(daemon=True)
+        self.url = urlsplit(url)
+        self.paths = paths
+        self.headers = headers
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.deadline = deadline
+        self.warmup_until = warmup_until
+        self.rnd = random.Random(seed)
+        self.samples = []
+
+    def connect(self):
+        connection_class = (
+            http.client.HTTPSConnection if self.url.scheme == 'https' else http.client.HTTPConnection
+        )
+        return connection_class(self.url.hostname, self.url.port, timeout=30)
+
+    def run(self):
+        connection = self.connect()
+        while time.perf_counter() < self.deadline:
+            name = self.rnd.choices(self.names, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                connection.request('GET', self.paths[name], headers=self.headers[name])
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = self.connect()
+                status = None
+            if started >= self.warmup_until:
+                self.samples.append((name, status, (time.perf_counter() - started) * 1000))
+        connection.close()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(samples, seconds):
+    latencies = [latency for _, _, latency in samples]
+    if not latencies:
+        return {'requests': 0}
+    return {
+        'requests': len(samples),
+        'requests_per_second': round(len(samples) / seconds, 1),
+        'errors': sum(1 for _, status, _ in samples if status is None or status >= 400),
+        'latency_ms_median': round(statistics.median(latencies), 3),
+        'latency_ms_p95': round(percentile(latencies, 0.95), 3),
+        'latency_ms_p99': round(percentile(latencies, 0.99), 3),
+        'latency_ms_max': round(max(latencies), 3),
+    }
+
+
+def compare(summary, baseline):
+    """Print each compared metric next to its baseline value"""
+    print("\nmetric                 baseline      current     change", file=sys.stderr)
+    for metric, lower_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(metric), summary.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change > 0 if lower_is_better else change < 0
+        flag = '  <-- worse' if worse and abs(change) >= 5 else ''
+        print(f"{metric:20} {old:12.3f} {new:12.3f} {change:+9.1f}%{flag}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="Deployment to test")
+    parser.add_argument('--concurrency', type=int, default=32, help="Simultaneous clients")
+    parser.add_argument('--duration', type=float, default=30.0, help="Seconds to send requests for")
+    parser.add_argument('--warmup', type=float, default=5.0,
+                        help="Seconds at the start whose requests are not counted")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('calendar:3,dashboard:1,upcoming:1'),
+                        help="Endpoint weights, as ENDPOINT:WEIGHT,...")
+    parser.add_argument('--tasks', type=int, default=200, help="Tasks to seed")
+    parser.add_argument('--sessions-per-day', type=int, default=4, help="Study sessions to seed per day")
+    parser.add_argument('--days', type=int, default=7, help="Days of data seeded and requested")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--label', help="Name for this run in the results, e.g. wsgi or asgi")
+    parser.add_argument('--output', default='-', help="JSON results file (default: stdout)")
+    parser.add_argument('--baseline', help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.utils import timezone
+
+    now = timezone.now()
+    print(f"Seeding {USERNAME} ...", file=sys.stderr)
+    session_key = seed(args, now)
+    paths = request_paths(args, now)
+    cookie = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={session_key}'}
+    headers = {
+        'calendar': cookie,
+        'dashboard': cookie,
+        'upcoming': {'Authorization': f'Token {USERNAME}', 'Accept': 'application/json'},
+    }
+
+    print(f"Running {args.concurrency} clients against {args.url} for {args.duration:g}s ...",
+          file=sys.stderr)
+    started = time.perf_counter()
+    warmup_until = started + args.warmup
+    deadline = warmup_until + args.duration
+    clients = [
+        Client(args.url, paths, headers, args.mix, deadline, warmup_until, args.seed + index)
+        for index in range(args.concurrency)
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+
+    samples = [sample for client in clients for sample in client.samples]
+    report = {
+        'created_at': now.isoformat(),
+        'label': args.label,
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('output', 'baseline', 'label')
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+        },
+        'summary': summarize(samples, args.duration),
+        'endpoints': {
+            name: summarize([sample for sample in samples if sample[0] == name], args.duration)
+            for name in args.mix
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        compare(report['summary'], baseline['summary'])
+
+
+if __name__ == '__main__':
+    main()
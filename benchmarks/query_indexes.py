@@ -0,0 +1,176 @@
+"""Compare query plans and timings of the hot query shapes with and without
+the composite indexes from planner migration 0005.
+
+Seeds a throwaway SQLite database (or the one named by --database) with
+synthetic users, tasks and sessions, then runs every query with the indexes
+rolled back and again with them applied.
+
+    python benchmarks/query_indexes.py --users 20000 --tasks-per-user 100
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'study_planner.settings')
+
+BEFORE_MIGRATION = '0004_userprofile_calendar_version'
+AFTER_MIGRATION = '0005_hot_query_indexes'
+OPEN_STATUSES = ['pending', 'in_progress']
+
+
+def setup_django(database):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+
+    import django
+    django.setup()
+
+
+def seed(users, tasks_per_user, sessions_per_user, batch_size=10000):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from planner.models import StudySession, Task, UserProfile
+
+    rnd = random.Random(42)
+    now = timezone.now()
+    statuses = ['pending', 'in_progress', 'completed']
+
+    user_objs = User.objects.bulk_create(
+        [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(users)],
+        batch_size=batch_size
+    )
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in user_objs], batch_size=batch_size)
+
+    def tasks():
+        for user in user_objs:
+            for i in range(tasks_per_user):
+                yield Task(
+                    user=user,
+                    title=f'Task {i}',
+                    due_date=now + timedelta(hours=rnd.randint(-24 * 60, 24 * 60)),
+                    priority=rnd.randint(1, 4),
+                    estimated_duration=rnd.choice([30, 60, 90, 120]),
+                    status=rnd.choice(statuses),
+                )
+
+    def sessions():
+        for user in user_objs:
+            for i in range(sessions_per_user):
+                start = now + timedelta(minutes=rnd.randint(-60 * 24 * 60, 60 * 24 * 60))
+                yield StudySession(
+                    user=user,
+                    title=f'Session {i}',
+                    start_time=start,
+                    end_time=start + timedelta(minutes=50),
+                    completed=start < now and rnd.random() < 0.7,
+                    auto_scheduled=True,
+                )
+
+    for model, rows in ((Task, tasks()), (StudySession, sessions())):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+
+def hot_queries(user_id, now):
+    """The query shapes the indexes are meant for, as (name, queryset)"""
+    from planner.models import StudySession, Task
+
+    week = now + timedelta(days=7)
+    month = now + timedelta(days=30)
+    return [
+        ('scheduler tasks', Task.objects.filter(
+            user_id=user_id, status__in=OPEN_STATUSES, due_date__gte=now
+        ).order_by('due_date')),
+        ('upcoming tasks', Task.objects.filter(
+            due_date__range=[now, week], status__in=OPEN_STATUSES
+        )),
+        ('calendar tasks', Task.objects.filter(
+            user_id=user_id, due_date__gte=now, due_date__lte=month
+        )),
+        ('planner delete', StudySession.objects.filter(
+            user_id=user_id, start_time__gte=now, completed=False
+        )),
+        ('calendar sessions', StudySession.objects.filter(
+            user_id=user_id, start_time__gte=now, end_time__lte=month
+        )),
+    ]
+
+
+def run_queries(user_ids, repeat):
+    from django.utils import timezone
+
+    now = timezone.now()
+    results = {}
+    for name, queryset in hot_queries(user_ids[0], now):
+        results[name] = {'plan': queryset.explain(), 'timings': []}
+
+    for i in range(repeat):
+        user_id = user_ids[i % len(user_ids)]
+        for name, queryset in hot_queries(user_id, now):
+            started = time.perf_counter()
+            list(queryset.values_list('id', flat=True))
+            results[name]['timings'].append((time.perf_counter() - started) * 1000)
+    return results
+
+
+def migrate_to(target):
+    from django.core.management import call_command
+    call_command('migrate', 'planner', target, verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help="SQLite file to use (default: a temporary file)")
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--tasks-per-user', type=int, default=100)
+    parser.add_argument('--sessions-per-user', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50, help="Timed runs of each query")
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    setup_django(database)
+
+    from django.core.management import call_command
+    from django.contrib.auth.models import User
+
+    call_command('migrate', verbosity=0)
+    if not User.objects.exists():
+        print(f"Seeding {args.users} users into {database} ...")
+        started = time.perf_counter()
+        seed(args.users, args.tasks_per_user, args.sessions_per_user)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    user_ids = list(User.objects.order_by('?').values_list('id', flat=True)[:args.repeat])
+
+    runs = {}
+    for label, target in (('before', BEFORE_MIGRATION), ('after', AFTER_MIGRATION)):
+        migrate_to(target)
+        runs[label] = run_queries(user_ids, args.repeat)
+
+    for name in runs['before']:
+        print(f"\n== {name}")
+        for label in ('before', 'after'):
+            result = runs[label][name]
+            timings = result['timings']
+            print(f"  {label:6} median {statistics.median(timings):8.2f} ms   "
+                  f"max {max(timings):8.2f} ms")
+            for line in result['plan'].splitlines():
+                print(f"           {line}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""Benchmark StudyPlannerAlgorithm.generate_schedule on synthetic users.
+
+Seeds a throwaway SQLite database (or the one named by --database) with users
+whose task counts, deadlines, priorities and study preferences follow the
+given mix, plans each of them once and writes the results as JSON.
+
+    python benchmarks/scheduler.py --users 50 --tasks 20-200 --deadlines clustered
+    python benchmarks/scheduler.py --output after.json --baseline before.json
+
+Every user is planned twice: once under tracemalloc inside a rolled back
+transaction to measure peak memory, then for real to measure wall time and
+query count without the tracing overhead.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'study_planner.settings')
+
+DEADLINE_DISTRIBUTIONS = ['uniform', 'clustered', 'front-loaded']
+# Summary metrics compared against --baseline, and whether lower is better
+COMPARED_METRICS = {
+    'wall_ms_median': True,
+    'wall_ms_p95': True,
+    'queries_max': True,
+    'peak_memory_kb_max': True,
+    'missed_deadlines': True,
+    'utilization_mean': False,
+}
+
+
+def setup_django(database):
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+
+    import django
+    django.setup()
+
+
+def parse_range(value):
+    """'50' -> (50, 50), '20-200' -> (20, 200)"""
+    low, _, high = value.partition('-')
+    low, high = int(low), int(high or low)
+    if low < 0 or high < low:
+        raise argparse.ArgumentTypeError(f"Invalid range: {value}")
+    return low, high
+
+
+def parse_weights(value):
+    """'1:1,2:2,3:2,4:1' -> {1: 1.0, 2: 2.0, 3: 2.0, 4: 1.0}"""
+    try:
+        weights = {
+            int(key): float(weight)
+            for key, weight in (item.split(':') for item in value.split(','))
+        }
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid weights: {value}")
+    if not weights or min(weights.values()) < 0 or not sum(weights.values()):
+        raise argparse.ArgumentTypeError(f"Invalid weights: {value}")
+    return weights
+
+
+def parse_ints(value):
+    try:
+        return [int(item) for item in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid list: {value}")
+
+
+def parse_time(value):
+    try:
+        return datetime.time.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid time: {value}")
+
+
+def deadline_offset(rnd, distribution, horizon):
+    """Seconds from now until a synthetic deadline within `horizon` days"""
+    seconds = horizon * 86400
+    if distribution == 'clustered':
+        # An exam week: most deadlines bunched around the last third
+        offset = rnd.gauss(seconds * 0.7, seconds * 0.08)
+    elif distribution == 'front-loaded':
+        offset = rnd.expovariate(4 / seconds)
+    else:
+        offset = rnd.uniform(0, seconds)
+    return min(max(offset, 3600), seconds)
+
+
+def random_profile(rnd, args):
+    """Study preferences, either the fixed ones given or random valid ones"""
+    if not args.vary_profiles:
+        return {
+            'preferred_study_hours_start': args.study_start,
+            'preferred_study_hours_end': args.study_end,
+            'study_session_duration': args.session_minutes,
+            'break_duration': args.break_minutes,
+            'daily_study_hours': args.daily_hours,
+        }
+    start = rnd.randint(6, 12)
+    return {
+        'preferred_study_hours_start': datetime.time(start, 0),
+        'preferred_study_hours_end': datetime.time(rnd.randint(start + 6, 23), 0),
+        'study_session_duration': rnd.choice([25, 45, 50, 60, 90, 120]),
+        'break_duration': rnd.choice([5, 10, 15, 30]),
+        'daily_study_hours': rnd.choice([1.0, 2.0, 4.0, 6.0, 8.0]),
+    }
+
+
+def seed(args, now, batch_size=10000):
+    from django.contrib.auth.models import User
+    from planner.models import Task, UserProfile
+
+    rnd = random.Random(args.seed)
+    priorities = list(args.priorities)
+    priority_weights = list(args.priorities.values())
+
+    users = User.objects.bulk_create(
+        [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(args.users)],
+        batch_size=batch_size
+    )
+    UserProfile.objects.bulk_create(
+        [UserProfile(user=user, **random_profile(rnd, args)) for user in users],
+        batch_size=batch_size
+    )
+
+    tasks = []
+    for user in users:
+        for i in range(rnd.randint(*args.tasks)):
+            tasks.append(Task(
+                user=user,
+                title=f'Task {i}',
+                due_date=now + timedelta(
+                    seconds=deadline_offset(rnd, args.deadlines, args.horizon)
+                ),
+                priority=rnd.choices(priorities, priority_weights)[0],
+                estimated_duration=rnd.choice(args.durations),
+            ))
+    Task.objects.bulk_create(tasks, batch_size=batch_size)
+    return [user.pk for user in users]
+
+
+def plan(user, args, now):
+    from planner.scheduling_algorithm import StudyPlannerAlgorithm
+    return StudyPlannerAlgorithm(user, args.strategy, now=now).generate_schedule(args.days)
+
+
+def measure_memory(user, args, now):
+    """Peak traced allocation of one plan, in KiB, leaving no rows behind"""
+    from django.db import transaction
+
+    with transaction.atomic():
+        tracemalloc.start()
+        try:
+            plan(user, args, now)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        transaction.set_rollback(True)
+    return peak / 1024
+
+
+def schedule_quality(user, args, now):
+    """Missed deadlines and utilization of the user's current schedule"""
+    from planner.models import StudySession, Task
+    from planner.scheduling_algorithm import StudyPlannerAlgorithm
+
+    horizon_end = now + timedelta(days=args.days)
+    sessions = StudySession.objects.filter(
+        user=user, start_time__gte=now, start_time__lt=horizon_end
+    ).values_list('task_id', 'start_time', 'end_time')
+    scheduled = 0
+    by_task = {}
+    ends_by_task = {}
+    for task_id, start, end in sessions:
+        minutes = (end - start).total_seconds() / 60
+        scheduled += minutes
+        by_task[task_id] = by_task.get(task_id, 0) + minutes
+        ends_by_task[task_id] = max(ends_by_task.get(task_id, end), end)
+
+    tasks = StudyPlannerAlgorithm.pending_tasks_query(now).filter(user=user).values_list(
+        'id', 'due_date', 'estimated_duration'
+    )
+    missed = 0
+    late = 0
+    unplanned = 0
+    for task_id, due_date, duration in tasks:
+        if task_id in ends_by_task and ends_by_task[task_id] > due_date:
+            late += 1
+        # Work due after the horizon may legitimately be planned later
+        if due_date <= horizon_end and by_task.get(task_id, 0) < duration:
+            missed += 1
+            unplanned += duration - by_task.get(task_id, 0)
+
+    planner = StudyPlannerAlgorithm(user, args.strategy, now=now)
+    capacity = sum(
+        (end - start).total_seconds() / 60
+        for start, end in planner.build_free_time_index(args.days)
+    )
+    return {
+        'scheduled_minutes': round(scheduled),
+        'capacity_minutes': round(capacity),
+        'utilization': round(scheduled / capacity, 4) if capacity else None,
+        'missed_deadlines': missed,
+        'unplanned_minutes': round(unplanned),
+        'late_sessions': late,
+    }
+
+
+def run(user_ids, args, now):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    results = []
+    for user in User.objects.filter(pk__in=user_ids).order_by('pk'):
+        task_count = user.task_set.count()
+        peak_kb = measure_memory(user, args, now) if args.memory else None
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            sessions = plan(user, args, now)
+            wall_ms = (time.perf_counter() - started) * 1000
+
+        results.append({
+            'user_id': user.pk,
+            'tasks': task_count,
+            'sessions': len(sessions),
+            'wall_ms': round(wall_ms, 3),
+            'queries': len(queries),
+            'peak_memory_kb': round(peak_kb, 1) if peak_kb is not None else None,
+            **schedule_quality(user, args, now),
+        })
+    return results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(results):
+    wall = [result['wall_ms'] for result in results]
+    utilization = [result['utilization'] for result in results if result['utilization'] is not None]
+    memory = [result['peak_memory_kb'] for result in results if result['peak_memory_kb'] is not None]
+    return {
+        'users': len(results),
+        'tasks': sum(result['tasks'] for result in results),
+        'sessions': sum(result['sessions'] for result in results),
+        'wall_ms_total': round(sum(wall), 3),
+        'wall_ms_median': round(statistics.median(wall), 3),
+        'wall_ms_p95': round(percentile(wall, 0.95), 3),
+        'wall_ms_max': round(max(wall), 3),
+        'queries_median': statistics.median(result['queries'] for result in results),
+        'queries_max': max(result['queries'] for result in results),
+        'peak_memory_kb_max': max(memory) if memory else None,
+        'missed_deadlines': sum(result['missed_deadlines'] for result in results),
+        'unplanned_minutes': sum(result['unplanned_minutes'] for result in results),
+        'late_sessions': sum(result['late_sessions'] for result in results),
+        'utilization_mean': round(statistics.mean(utilization), 4) if utilization else None,
+    }
+
+
+def compare(summary, baseline):
+    """Print each compared metric next to its baseline value"""
+    print("\nmetric                 baseline      current     change", file=sys.stderr)
+    for metric, lower_is_better in COMPARED_METRICS.items():
+        old, new = baseline.get(metric), summary.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change > 0 if lower_is_better else change < 0
+        flag = '  <-- worse' if worse and abs(change) >= 5 else ''
+        print(f"{metric:20} {old:12.3f} {new:12.3f} {change:+9.1f}%{flag}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help="SQLite file to use (default: a temporary file)")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--tasks', type=parse_range, default=(50, 50),
+                        help="Tasks per user, as N or MIN-MAX")
+    parser.add_argument('--deadlines', choices=DEADLINE_DISTRIBUTIONS, default='uniform')
+    parser.add_argument('--horizon', type=int, default=14,
+                        help="Days from now that deadlines are spread over")
+    parser.add_argument('--priorities', type=parse_weights, default=parse_weights('1:1,2:2,3:2,4:1'),
+                        help="Priority weights, as PRIORITY:WEIGHT,...")
+    parser.add_argument('--durations', type=parse_ints, default=[30, 60, 90, 120, 240],
+                        help="Estimated task durations in minutes to pick from")
+    parser.add_argument('--study-start', type=parse_time, default=datetime.time(9, 0))
+    parser.add_argument('--study-end', type=parse_time, default=datetime.time(21, 0))
+    parser.add_argument('--session-minutes', type=int, default=50)
+    parser.add_argument('--break-minutes', type=int, default=15)
+    parser.add_argument('--daily-hours', type=float, default=4.0)
+    parser.add_argument('--vary-profiles', action='store_true',
+                        help="Give each user random study preferences instead")
+    parser.add_argument('--days', type=int, default=7, help="Days to plan ahead")
+    parser.add_argument('--strategy', default='least_slack', help="Scheduling strategy")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="Skip the tracemalloc pass")
+    parser.add_argument('--output', default='-', help="JSON results file (default: stdout)")
+    parser.add_argument('--baseline', help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    setup_django(database)
+
+    import django
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils import timezone
+    from planner.scheduling_algorithm import get_strategy
+
+    try:
+        get_strategy(args.strategy)
+    except ValueError as e:
+        parser.error(str(e))
+
+    call_command('migrate', verbosity=0)
+    now = timezone.now()
+    print(f"Seeding {args.users} users into {database} ...", file=sys.stderr)
+    user_ids = seed(args, now)
+    print(f"Planning {len(user_ids)} users ...", file=sys.stderr)
+    results = run(user_ids, args, now)
+
+    config = {
+        key: value.isoformat() if isinstance(value, datetime.time) else value
+        for key, value in vars(args).items()
+        if key not in ('output', 'baseline', 'database')
+    }
+    report = {
+        'created_at': now.isoformat(),
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'machine': platform.machine(),
+        },
+        'summary': summarize(results),
+        'users': results,
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        compare(report['summary'], baseline['summary'])
+
+
+if __name__ == '__main__':
+    main()
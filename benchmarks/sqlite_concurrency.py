@@ -0,0 +1,267 @@
+"""Measure how schedule generation on SQLite holds up concurrent readers.
+
+Seeds a throwaway SQLite database with synthetic users and tasks, then
+generates every user's schedule in one process while --readers other
+processes load calendar feeds, as web workers would. The writer runs
+plan_all, which writes each chunk of users in one transaction, or with
+--writer jobs one schedule job per user. This runs once with
+SQLite's defaults and once with SQLITE_TUNING, each on a fresh copy of the
+database, and writes read latencies and lock errors as JSON.
+
+    python benchmarks/sqlite_concurrency.py --users 50 --tasks 100 --readers 4
+    python benchmarks/sqlite_concurrency.py --writer jobs --modes tuned --output tuned.json
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'study_planner.settings')
+
+MODES = ['default', 'tuned']
+WRITERS = ['plan_all', 'jobs']
+
+
+def setup_django(database, tuned):
+    # Settings read SQLITE_TUNING when they are first imported
+    os.environ['SQLITE_TUNING'] = '1' if tuned else ''
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+
+    import django
+    django.setup()
+
+
+def seed(args, now):
+    from django.contrib.auth.models import User
+    from planner.models import Task, UserProfile
+
+    rnd = random.Random(args.seed)
+    users = User.objects.bulk_create(
+        [User(username=f'bench{i}', email=f'bench{i}@example.com') for i in range(args.users)]
+    )
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+    Task.objects.bulk_create(
+        [
+            Task(
+                user=user,
+                title=f'Task {i}',
+                due_date=now + timedelta(seconds=rnd.uniform(3600, args.days * 2 * 86400)),
+                priority=rnd.randint(1, 4),
+                estimated_duration=rnd.choice([30, 60, 90, 120, 240]),
+            )
+            for user in users
+            for i in range(args.tasks)
+        ],
+        batch_size=10000,
+    )
+    return [user.pk for user in users]
+
+
+def is_locked(error):
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def write(database, tuned, user_ids, args, started, done, queue):
+    """Generate every user's schedule with plan_all or as one job per user"""
+    setup_django(database, tuned)
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.db import OperationalError
+    from planner.scheduling_algorithm import StudyPlannerAlgorithm
+
+    users = User.objects.in_bulk(user_ids)
+    started.wait()
+    timings = []
+    errors = 0
+    begin = time.perf_counter()
+    try:
+        if args.writer == 'plan_all':
+            call_command(
+                'plan_all', workers=1, days=args.days, strategy=args.strategy,
+                chunk_size=args.chunk_size, stdout=io.StringIO()
+            )
+            timings.append((time.perf_counter() - begin) * 1000)
+        else:
+            for user_id in user_ids:
+                job_started = time.perf_counter()
+                try:
+                    StudyPlannerAlgorithm(users[user_id], args.strategy).generate_schedule(args.days)
+                except OperationalError as e:
+                    if not is_locked(e):
+                        raise
+                    errors += 1
+                timings.append((time.perf_counter() - job_started) * 1000)
+    except OperationalError as e:
+        if not is_locked(e):
+            raise
+        errors += 1
+        timings.append((time.perf_counter() - begin) * 1000)
+    finally:
+        done.set()
+    queue.put({
+        'role': 'writer',
+        'seconds': time.perf_counter() - begin,
+        'timings': timings,
+        'errors': errors,
+    })
+
+
+def read(database, tuned, user_ids, args, seed, ready, started, done, queue):
+    """Load calendar feeds for random users until the writer finishes"""
+    setup_django(database, tuned)
+    from asgiref.sync import async_to_sync
+    from django.db import OperationalError
+    from django.utils import timezone
+    from planner.calendar_feed import aserialize_events
+
+    # The async ORM runs the feed's queries back on this thread
+    serialize_events = async_to_sync(aserialize_events)
+
+    rnd = random.Random(seed)
+    now = timezone.now()
+    ready.release()
+    started.wait()
+    timings = []
+    errors = 0
+    while not done.is_set():
+        read_started = time.perf_counter()
+        try:
+            serialize_events(rnd.choice(user_ids), now, now + timedelta(days=args.days))
+        except OperationalError as e:
+            if not is_locked(e):
+                raise
+            errors += 1
+        timings.append((time.perf_counter() - read_started) * 1000)
+    queue.put({'role': 'reader', 'timings': timings, 'errors': errors})
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_mode(mode, database, user_ids, args):
+    context = multiprocessing.get_context('spawn')
+    tuned = mode == 'tuned'
+    ready = context.Semaphore(0)
+    started = context.Event()
+    done = context.Event()
+    queue = context.Queue()
+    processes = [
+        context.Process(target=read, args=(
+            database, tuned, user_ids, args, args.seed + index, ready, started, done, queue
+        ))
+        for index in range(args.readers)
+    ]
+    processes.append(context.Process(
+        target=write, args=(database, tuned, user_ids, args, started, done, queue)
+    ))
+    for process in processes:
+        process.start()
+    for _ in range(args.readers):
+        ready.acquire()
+    started.set()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    writer = next(result for result in results if result['role'] == 'writer')
+    reads = [timing for result in results if result['role'] == 'reader' for timing in result['timings']]
+    return {
+        'write_seconds': round(writer['seconds'], 3),
+        'write_ms_median': round(statistics.median(writer['timings']), 3),
+        'write_ms_max': round(max(writer['timings']), 3),
+        'write_lock_errors': writer['errors'],
+        'reads': len(reads),
+        'reads_per_second': round(len(reads) / writer['seconds'], 1),
+        'read_ms_median': round(statistics.median(reads), 3) if reads else None,
+        'read_ms_p95': round(percentile(reads, 0.95), 3) if reads else None,
+        'read_ms_p99': round(percentile(reads, 0.99), 3) if reads else None,
+        'read_ms_max': round(max(reads), 3) if reads else None,
+        'read_lock_errors': sum(result['errors'] for result in results if result['role'] == 'reader'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=30)
+    parser.add_argument('--tasks', type=int, default=100, help="Tasks per user")
+    parser.add_argument('--readers', type=int, default=4, help="Concurrent reader processes")
+    parser.add_argument('--writer', choices=WRITERS, default='plan_all')
+    parser.add_argument('--chunk-size', type=int, default=200, help="Users per plan_all transaction")
+    parser.add_argument('--days', type=int, default=7, help="Days to plan ahead")
+    parser.add_argument('--strategy', default='least_slack', help="Scheduling strategy")
+    parser.add_argument('--modes', type=lambda value: value.split(','), default=MODES,
+                        help="Comma-separated modes to run: default, tuned")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='-', help="JSON results file (default: stdout)")
+    args = parser.parse_args()
+    if set(args.modes) - set(MODES):
+        parser.error(f"Unknown modes: {', '.join(sorted(set(args.modes) - set(MODES)))}")
+
+    directory = tempfile.mkdtemp()
+    seeded = os.path.join(directory, 'seed.sqlite3')
+    setup_django(seeded, tuned=False)
+
+    import django
+    from django.core.management import call_command
+    from django.db import connection
+    from django.utils import timezone
+
+    call_command('migrate', verbosity=0)
+    print(f"Seeding {args.users} users into {seeded} ...", file=sys.stderr)
+    user_ids = seed(args, timezone.now())
+    connection.close()
+
+    results = {}
+    for mode in args.modes:
+        database = os.path.join(directory, f'{mode}.sqlite3')
+        shutil.copyfile(seeded, database)
+        print(f"Generating {len(user_ids)} schedules against {args.readers} readers "
+              f"with {mode} settings ...", file=sys.stderr)
+        results[mode] = run_mode(mode, database, user_ids, args)
+
+    print("\nmode        reads/s  read p50 ms  read p99 ms  read max ms  lock errors  write s",
+          file=sys.stderr)
+    for mode, result in results.items():
+        print(
+            f"{mode:10} {result['reads_per_second']:8} {result['read_ms_median']:12} "
+            f"{result['read_ms_p99']:12} {result['read_ms_max']:12} "
+            f"{result['read_lock_errors'] + result['write_lock_errors']:12} {result['write_seconds']:8}",
+            file=sys.stderr
+        )
+
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': connection.Database.sqlite_version,
+            'machine': platform.machine(),
+        },
+        'modes': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        Path(args.output).write_text(output + '\n')
+        print(f"Wrote {args.output}", file=sys.stderr)
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,6 @@ import java.time.LocalDateTime;
 import java.time.format.DateTimeFormatter;
 import java.util.Timer;
 import java.util.TimerTask;
-import org.json.JSONArray;
 import org.json.JSONObject;
 
 public class NotificationService {
@@ -13,6 +12,15 @@ public class NotificationService {
     private static final int CHECK_INTERVAL = 5 * 60 * 1000; // 5 minutes
     
     public static void main(String[] args) {
+        // Reminders are sent by the server's dispatcher (manage.py run_notifier),
+        // which also covers study sessions. Polling here as well would send every
+        // task reminder twice, so it only runs when asked for explicitly
+        if (args.length == 0 || !args[0].equals("--legacy")) {
+            System.out.println("Reminders are sent by 'python manage.py run_notifier'. "
+                + "Pass --legacy to poll and print task reminders from here instead.");
+            return;
+        }
+        
         Timer timer = new Timer();
         timer.scheduleAtFixedRate(new TimerTask() {
             @Override
@@ -27,20 +35,20 @@ public class NotificationService {
             URL url = new URL(API_URL);
             HttpURLConnection conn = (HttpURLConnection) url.openConnection();
             conn.setRequestMethod("GET");
+            // One task per line, so tasks are handled as they arrive
+            conn.setRequestProperty("Accept", "application/x-ndjson");
             
             int responseCode = conn.getResponseCode();
             if (responseCode == HttpURLConnection.HTTP_OK) {
                 BufferedReader in = new BufferedReader(new InputStreamReader(conn.getInputStream()));
                 String inputLine;
-                StringBuilder response = new StringBuilder();
                 
                 while ((inputLine = in.readLine()) != null) {
-                    response.append(inputLine);
+                    if (!inputLine.isEmpty()) {
+                        processTask(new JSONObject(inputLine));
+                    }
                 }
                 in.close();
-                
-                JSONArray tasks = new JSONArray(response.toString());
-                processTasks(tasks);
             } else {
                 System.out.println("GET request failed. Response code: " + responseCode);
             }
@@ -49,23 +57,20 @@ public class NotificationService {
         }
     }
     
-    private static void processTasks(JSONArray tasks) {
+    private static void processTask(JSONObject task) {
         DateTimeFormatter formatter = DateTimeFormatter.ofPattern("yyyy-MM-dd'T'HH:mm:ss");
         LocalDateTime now = LocalDateTime.now();
         
-        for (int i = 0; i < tasks.length(); i++) {
-            JSONObject task = tasks.getJSONObject(i);
-            String dueDateStr = task.getString("due_date");
-            LocalDateTime dueDate = LocalDateTime.parse(dueDateStr.substring(0, 19), formatter);
+        String dueDateStr = task.getString("due_date");
+        LocalDateTime dueDate = LocalDateTime.parse(dueDateStr.substring(0, 19), formatter);
+        
+        // Check if task is due within the next 24 hours
+        if (dueDate.isAfter(now) && dueDate.isBefore(now.plusHours(24))) {
+            String title = task.getString("title");
+            String message = "Reminder: Task '" + title + "' is due on " + 
+                            dueDate.format(DateTimeFormatter.ofPattern("MMM dd, yyyy HH:mm"));
             
-            // Check if task is due within the next 24 hours
-            if (dueDate.isAfter(now) && dueDate.isBefore(now.plusHours(24))) {
-                String title = task.getString("title");
-                String message = "Reminder: Task '" + title + "' is due on " + 
-                                dueDate.format(DateTimeFormatter.ofPattern("MMM dd, yyyy HH:mm"));
-                
-                sendNotification(message);
-            }
+            sendNotification(message);
         }
     }
     
@@ -0,0 +1,196 @@
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db.models import F
+
+from .models import StudySession, Task, UserProfile
+
+# Every field an event can carry, in output order
+EVENT_FIELDS = ['id', 'title', 'start', 'end', 'allDay', 'color', 'type', 'task', 'course']
+EXTENDED_PROPS = {'type', 'task', 'course'}
+
+# Marks fields that do not apply to an event, e.g. 'end' on a task deadline
+MISSING = object()
+
+SESSION_COLUMNS = {
+    'id': 'id',
+    'title': 'title',
+    'start': 'start_time',
+    'end': 'end_time',
+    'color': 'course__color',
+    'task': 'task__title',
+    'course': 'course__name',
+}
+
+SESSION_VALUES = {
+    'id': lambda row: row['id'],
+    'title': lambda row: row['title'],
+    'start': lambda row: row['start_time'].isoformat(),
+    'end': lambda row: row['end_time'].isoformat(),
+    'allDay': lambda row: MISSING,
+    'color': lambda row: row['course__color'] if row['course__color'] is not None else '#3b82f6',
+    'type': lambda row: 'study_session',
+    'task': lambda row: row['task__title'] if row['task__title'] is not None else 'General Study',
+    'course': lambda row: row['course__name'] if row['course__name'] is not None else 'No Course',
+}
+
+TASK_COLUMNS = {
+    'id': 'id',
+    'title': 'title',
+    'start': 'due_date',
+}
+
+TASK_VALUES = {
+    'id': lambda row: f"task-{row['id']}",
+    'title': lambda row: f"Due: {row['title']}",
+    'start': lambda row: row['due_date'].isoformat(),
+    'end': lambda row: MISSING,
+    'allDay': lambda row: True,
+    'color': lambda row: '#ef4444',
+    'type': lambda row: 'task_due',
+    'task': lambda row: MISSING,
+    'course': lambda row: MISSING,
+}
+
+
+def parse_fields(value):
+    """Parse a comma-separated `fields=` parameter into EVENT_FIELDS order.
+
+    Raises ValueError for unknown fields.
+    """
+    if not value:
+        return list(EVENT_FIELDS)
+    requested = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = requested - set(EVENT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in EVENT_FIELDS if field in requested]
+
+
+def _columns(fields, column_map):
+    columns = [column_map[field] for field in fields if field in column_map]
+    return columns or ['id']
+
+
+async def aevent_rows(user, start_date, end_date, fields):
+    """Yield (kind_values, row) pairs for sessions and task deadlines in range.
+
+    Runs exactly two queries, selecting only the columns `fields` need.
+    """
+    sessions = StudySession.objects.filter(
+        user=user,
+        start_time__gte=start_date,
+        end_time__lte=end_date
+    ).values(*_columns(fields, SESSION_COLUMNS))
+    async for row in sessions:
+        yield SESSION_VALUES, row
+
+    tasks = Task.objects.filter(
+        user=user,
+        due_date__gte=start_date,
+        due_date__lte=end_date
+    ).values(*_columns(fields, TASK_COLUMNS))
+    async for row in tasks:
+        yield TASK_VALUES, row
+
+
+async def aserialize_events(user, start_date, end_date, fields=None, compact=False):
+    """Build the calendar feed for FullCalendar.
+
+    The default format is a list of event objects with type/task/course
+    under extendedProps. The compact format returns the field names once
+    and each event as an array, with null for fields that do not apply.
+    """
+    fields = fields or list(EVENT_FIELDS)
+    rows = [row async for row in aevent_rows(user, start_date, end_date, fields)]
+    return build_events(rows, fields, compact)
+
+
+def build_events(rows, fields, compact):
+    if compact:
+        events = []
+        for values, row in rows:
+            event = []
+            for field in fields:
+                value = values[field](row)
+                event.append(None if value is MISSING else value)
+            events.append(event)
+        return {'fields': fields, 'events': events}
+
+    events = []
+    for values, row in rows:
+        event = {}
+        extended_props = {}
+        for field in fields:
+            value = values[field](row)
+            if value is MISSING:
+                continue
+            if field in EXTENDED_PROPS:
+                extended_props[field] = value
+            else:
+                event[field] = value
+        if extended_props:
+            event['extendedProps'] = extended_props
+        events.append(event)
+    return events
+
+
+_batch = threading.local()
+
+
+def bump_calendar_version(*user_ids):
+    """Invalidate cached calendar feeds and ETags for the given users.
+
+    Inside calendar_changes() the bumps are collected and applied together.
+    """
+    pending = getattr(_batch, 'user_ids', None)
+    if pending is not None:
+        pending.update(user_ids)
+        return
+    UserProfile.objects.filter(user_id__in=user_ids).update(
+        calendar_version=F('calendar_version') + 1
+    )
+
+
+@contextmanager
+def calendar_changes():
+    """Collect calendar version bumps and apply them in one query on exit.
+
+    Use around bulk writes so that per-row signals cost one UPDATE in total.
+    """
+    if getattr(_batch, 'user_ids', None) is not None:
+        # Nested batch; the outermost one applies the bumps
+        yield
+        return
+    _batch.user_ids = set()
+    try:
+        yield
+    finally:
+        user_ids = _batch.user_ids
+        _batch.user_ids = None
+        if user_ids:
+            bump_calendar_version(*user_ids)
+
+
+async def aget_calendar_version(user):
+    """Return the user's calendar version, or None if they have no profile"""
+    return await UserProfile.objects.filter(user=user).values_list(
+        'calendar_version', flat=True
+    ).afirst()
+
+
+def cache_key(user, version, params):
+    """Build the response cache key for a user's feed at a version"""
+    query = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return f'calendar-events:{user.pk}:{version}:{digest}'
+
+
+async def aget_cached_response(key):
+    return await caches['calendar'].aget(key)
+
+
+async def aset_cached_response(key, content):
+    await caches['calendar'].aset(key, content)
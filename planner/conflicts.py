@@ -0,0 +1,64 @@
+import heapq
+from datetime import timedelta
+
+from .models import StudySession
+
+SESSION_COLUMNS = ['id', 'start_time', 'end_time', 'auto_scheduled', 'completed']
+# Longer sessions are rejected, which bounds how far back overlaps are searched
+MAX_SESSION_LENGTH = timedelta(hours=24)
+
+
+def overlapping_sessions(user, start, end, exclude_ids=()):
+    """A user's sessions overlapping [start, end), as values dicts.
+
+    Only sessions starting at most MAX_SESSION_LENGTH before `start` can
+    reach into the range, so one bounded scan of the (user, start_time)
+    index finds every overlap without reading the user's history, even
+    where older sessions already overlap each other.
+    """
+    return list(
+        StudySession.objects.filter(
+            user=user,
+            start_time__gte=start - MAX_SESSION_LENGTH,
+            start_time__lt=end,
+            end_time__gt=start,
+        ).exclude(pk__in=exclude_ids).order_by('start_time').values(*SESSION_COLUMNS)
+    )
+
+
+def is_replaceable(session, now):
+    """Whether the planner moves this session out of the way instead of conflicting.
+
+    `session` is a StudySession or a values dict with SESSION_COLUMNS.
+    """
+    if isinstance(session, StudySession):
+        session = {column: getattr(session, column) for column in SESSION_COLUMNS}
+    return session['auto_scheduled'] and not session['completed'] and session['start_time'] >= now
+
+
+def find_conflicts(sessions):
+    """Every overlapping pair among `sessions`, sorted by start time.
+
+    A sweep over start times keeps a heap of the sessions still running, so
+    it takes O(n log n) plus the number of pairs reported. Each session is
+    a dict with 'id', 'start_time' and 'end_time'; results are tuples of
+    (earlier id, later id, overlap start, overlap end).
+    """
+    conflicts = []
+    active = []
+    for seq, session in enumerate(sorted(sessions, key=lambda session: session['start_time'])):
+        start = session['start_time']
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for end, _, other in active:
+            conflicts.append((other['id'], session['id'], start, min(end, session['end_time'])))
+        heapq.heappush(active, (session['end_time'], seq, session))
+    return conflicts
+
+
+def session_conflicts(user, start, end):
+    """Overlapping pairs among a user's sessions that intersect [start, end)"""
+    sessions = StudySession.objects.filter(
+        user=user, start_time__lt=end, end_time__gt=start
+    ).order_by('start_time').values('id', 'start_time', 'end_time')
+    return find_conflicts(sessions)
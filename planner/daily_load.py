@@ -0,0 +1,123 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DailyLoad, StudySession, UserProfile
+from .timezones import local_date
+
+_batch = threading.local()
+
+
+def _add(changes, contribution, sign):
+    if contribution is not None:
+        changes.append((sign, contribution))
+
+
+def resolve_changes(changes):
+    """Sum signed session contributions per (user_id, local date).
+
+    Looks up the time zones of every user involved in one query.
+    """
+    user_ids = {user_id for _, (user_id, *_) in changes}
+    zones = dict(
+        UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'timezone')
+    )
+    deltas = {}
+    for sign, (user_id, start_time, minutes, completed_minutes) in changes:
+        date = local_date(start_time, zones.get(user_id, 'UTC'))
+        delta = deltas.setdefault((user_id, date), [0, 0])
+        delta[0] += sign * minutes
+        delta[1] += sign * completed_minutes
+    return deltas
+
+
+def apply_deltas(deltas):
+    """Add {(user_id, date): [scheduled, completed]} minute deltas to DailyLoad.
+
+    One atomic increment per touched day, so concurrent writers cannot lose
+    each other's updates.
+    """
+    for (user_id, date), (scheduled, completed) in deltas.items():
+        if not scheduled and not completed:
+            continue
+        updated = DailyLoad.objects.filter(user_id=user_id, date=date).update(
+            scheduled_minutes=F('scheduled_minutes') + scheduled,
+            completed_minutes=F('completed_minutes') + completed
+        )
+        if updated or scheduled < 0:
+            # A missing row cannot go negative; it was deleted with its user
+            continue
+        try:
+            with transaction.atomic():
+                DailyLoad.objects.create(
+                    user_id=user_id, date=date,
+                    scheduled_minutes=scheduled, completed_minutes=completed
+                )
+        except IntegrityError:
+            # Created concurrently; increment that row instead
+            DailyLoad.objects.filter(user_id=user_id, date=date).update(
+                scheduled_minutes=F('scheduled_minutes') + scheduled,
+                completed_minutes=F('completed_minutes') + completed
+            )
+
+
+def record_session_change(old, new):
+    """Move a session's minutes from its old (user, day) contribution to its new one"""
+    changes = getattr(_batch, 'changes', None)
+    if changes is not None:
+        _add(changes, old, -1)
+        _add(changes, new, 1)
+        return
+    changes = []
+    _add(changes, old, -1)
+    _add(changes, new, 1)
+    if changes:
+        apply_deltas(resolve_changes(changes))
+
+
+def record_sessions_created(sessions):
+    """Count sessions written with bulk_create, which sends no signals"""
+    for session in sessions:
+        record_session_change(None, session.load_contribution())
+
+
+@contextmanager
+def daily_load_changes():
+    """Collect DailyLoad deltas and apply them once per day on exit.
+
+    Use around bulk writes so per-row signals cost one update per day.
+    """
+    if getattr(_batch, 'changes', None) is not None:
+        yield
+        return
+    _batch.changes = []
+    try:
+        yield
+        changes = _batch.changes
+    finally:
+        _batch.changes = None
+    if changes:
+        apply_deltas(resolve_changes(changes))
+
+
+def rebuild_daily_loads(user_id, zone_name):
+    """Recount a user's DailyLoad rows from scratch, e.g. after a time zone change"""
+    loads = {}
+    sessions = StudySession.objects.filter(user_id=user_id).values_list(
+        'start_time', 'end_time', 'completed'
+    )
+    for start_time, end_time, completed in sessions.iterator():
+        minutes = round((end_time - start_time).total_seconds() / 60)
+        load = loads.setdefault(local_date(start_time, zone_name), [0, 0])
+        load[0] += minutes
+        if completed:
+            load[1] += minutes
+
+    with transaction.atomic():
+        DailyLoad.objects.filter(user_id=user_id).delete()
+        DailyLoad.objects.bulk_create([
+            DailyLoad(user_id=user_id, date=date, scheduled_minutes=scheduled, completed_minutes=done)
+            for date, (scheduled, done) in loads.items()
+        ], batch_size=1000)
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import StudySession, Task, UserProfile
+from .timezones import day_bounds, local_date
+
+UPCOMING_TASK_COUNT = 5
+CACHE_TIMEOUT = 15 * 60
+
+
+def _profile_query(user):
+    return UserProfile.objects.filter(user=user).values_list('calendar_version', 'timezone')
+
+
+def _querysets(user, now, zone):
+    upcoming_tasks = Task.objects.filter(
+        user=user,
+        due_date__gte=now
+    ).select_related('course').order_by('due_date')[:UPCOMING_TASK_COUNT]
+
+    # "Today" is the user's local day
+    today_start, today_end = day_bounds(zone, local_date(now, zone))
+    today_sessions = StudySession.objects.filter(
+        user=user,
+        start_time__gte=today_start,
+        start_time__lt=today_end
+    ).select_related('course', 'task').order_by('start_time')
+    return upcoming_tasks, today_sessions
+
+
+async def _aload(user, now, zone):
+    upcoming_tasks, today_sessions = _querysets(user, now, zone)
+    return {
+        'upcoming_tasks': [task async for task in upcoming_tasks],
+        'today_sessions': [session async for session in today_sessions],
+    }
+
+
+def _cache_key(user, version, now, zone):
+    return f'dashboard:{user.pk}:{version}:{zone}:{local_date(now, zone).isoformat()}'
+
+
+def _cache_timeout(data, now):
+    timeout = CACHE_TIMEOUT
+    if data['upcoming_tasks']:
+        # Expire once the first upcoming task is no longer upcoming
+        first_due = (data['upcoming_tasks'][0].due_date - now).total_seconds()
+        timeout = max(1, min(timeout, int(first_due)))
+    return timeout
+
+
+async def aload_dashboard(user):
+    """Load the dashboard's upcoming tasks and today's sessions.
+
+    Related courses and tasks are fetched with the rows so rendering runs no
+    further queries. Results are cached per user, calendar version and local
+    date. The Task/Course/StudySession signals bump the version on every
+    write, so a warm load costs a single profile lookup.
+    """
+    now = timezone.now()
+    profile = await _profile_query(user).afirst()
+    if profile is None:
+        return await _aload(user, now, 'UTC')
+
+    version, zone = profile
+    key = _cache_key(user, version, now, zone)
+    data = await cache.aget(key)
+    if data is not None:
+        return data
+
+    data = await _aload(user, now, zone)
+    await cache.aset(key, data, _cache_timeout(data, now))
+    return data
@@ -30,7 +30,7 @@ class UserProfileForm(forms.ModelForm):
     class Meta:
         model = UserProfile
         fields = ['preferred_study_hours_start', 'preferred_study_hours_end', 
-                 'break_duration', 'study_session_duration', 'daily_study_hours']
+                 'break_duration', 'study_session_duration', 'daily_study_hours', 'timezone']
         widgets = {
             'preferred_study_hours_start': forms.TimeInput(attrs={
                 'type': 'time',
@@ -56,6 +56,9 @@ class UserProfileForm(forms.ModelForm):
                 'max': '12.0',
                 'step': '0.5'
             }),
+            'timezone': forms.Select(attrs={
+                'class': 'w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500'
+            }),
         }
 
 class CourseForm(forms.ModelForm):
@@ -112,6 +115,32 @@ class TaskForm(forms.ModelForm):
         super(TaskForm, self).__init__(*args, **kwargs)
         self.fields['course'].queryset = Course.objects.filter(user=user)
 
+class TaskImportForm(forms.ModelForm):
+    """TaskForm's rules for one imported row.
+    
+    The course is given by code (or name) and resolved through a map built
+    once per import, so validating a row runs no queries.
+    """
+    course = forms.CharField(required=False)
+    status = forms.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    
+    class Meta:
+        model = Task
+        fields = [field for field in TaskForm.Meta.fields if field != 'course']
+    
+    def __init__(self, courses, *args, **kwargs):
+        super(TaskImportForm, self).__init__(*args, **kwargs)
+        self.courses = courses
+    
+    def clean_course(self):
+        code = self.cleaned_data['course'].strip()
+        if not code:
+            return None
+        course = self.courses.get(code.lower())
+        if course is None:
+            raise forms.ValidationError(f"No course with code {code}")
+        return course
+
 class StudySessionForm(forms.ModelForm):
     class Meta:
         model = StudySession
@@ -0,0 +1,86 @@
+import bisect
+from datetime import timedelta
+
+
+class FreeTimeIndex:
+    """Sorted, non-overlapping free intervals kept in two parallel arrays.
+
+    Lookups use bisect so carving out a busy interval or finding where a
+    query starts is O(log n).
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends)
+
+    def _span(self, start, end):
+        """Return the index range of intervals overlapping [start, end)"""
+        lo = bisect.bisect_right(self.ends, start)
+        hi = bisect.bisect_left(self.starts, end, lo)
+        return lo, hi
+
+    def add(self, start, end):
+        """Mark [start, end) as free, merging it with overlapping intervals"""
+        if end <= start:
+            return
+        lo, hi = self._span(start, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def carve(self, start, end):
+        """Mark [start, end) as busy, trimming or splitting free intervals"""
+        if end <= start:
+            return
+        lo, hi = self._span(start, end)
+        if lo >= hi:
+            return
+        new_starts = []
+        new_ends = []
+        if self.starts[lo] < start:
+            new_starts.append(self.starts[lo])
+            new_ends.append(start)
+        if self.ends[hi - 1] > end:
+            new_starts.append(end)
+            new_ends.append(self.ends[hi - 1])
+        self.starts[lo:hi] = new_starts
+        self.ends[lo:hi] = new_ends
+
+    def limit(self, start, end, minutes):
+        """Keep only the earliest `minutes` of free time within [start, end)"""
+        budget = timedelta(minutes=max(0, minutes))
+        lo, hi = self._span(start, end)
+        for i in range(lo, hi):
+            available = min(self.ends[i], end) - max(self.starts[i], start)
+            if available > budget:
+                self.carve(max(self.starts[i], start) + budget, end)
+                return
+            budget -= available
+    
+    def first_fit(self, minutes, not_before=None, deadline=None):
+        """Return the earliest start with `minutes` of contiguous free time.
+
+        The block must begin at or after `not_before` and end by `deadline`.
+        Returns None when no interval fits.
+        """
+        duration = timedelta(minutes=minutes)
+        i = 0
+        if not_before is not None:
+            i = bisect.bisect_right(self.ends, not_before)
+        for j in range(i, len(self.starts)):
+            start = self.starts[j]
+            if not_before is not None and start < not_before:
+                start = not_before
+            if deadline is not None and start + duration > deadline:
+                return None
+            if start + duration <= self.ends[j]:
+                return start
+        return None
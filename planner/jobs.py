@@ -0,0 +1,99 @@
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import ScheduleJob
+from .scheduling_algorithm import DEFAULT_STRATEGY, StudyPlannerAlgorithm
+from .tracing import PlannerTrace
+
+logger = logging.getLogger(__name__)
+
+# Running jobs older than this are assumed to have lost their worker
+JOB_TIMEOUT = timedelta(minutes=15)
+
+
+def enqueue_schedule_job(user, strategy=DEFAULT_STRATEGY, days=7):
+    """Queue schedule generation for a user.
+
+    If the user already has a pending job it is updated and returned
+    instead, so repeated requests coalesce into one run.
+    """
+    defaults = {'strategy': strategy, 'days': days}
+    try:
+        with transaction.atomic():
+            job, created = ScheduleJob.objects.update_or_create(
+                user=user, status='pending', defaults=defaults
+            )
+    except IntegrityError:
+        # Another request created the pending job first
+        job = ScheduleJob.objects.get(user=user, status='pending')
+    return job
+
+
+def fail_stale_jobs(now=None):
+    """Fail running jobs whose worker stopped before finishing them.
+
+    Returns the number of jobs failed. Users can queue a new job, which is
+    not blocked by the failed one.
+    """
+    now = now or timezone.now()
+    count = ScheduleJob.objects.filter(
+        status='running', started_at__lt=now - JOB_TIMEOUT
+    ).update(
+        status='failed',
+        error="The worker stopped before finishing this job",
+        finished_at=now,
+    )
+    if count:
+        logger.warning("Failed %d schedule jobs running for over %s", count, JOB_TIMEOUT)
+    return count
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None"""
+    fail_stale_jobs()
+    while True:
+        job = ScheduleJob.objects.filter(status='pending').order_by('created_at').first()
+        if job is None:
+            return None
+        # The conditional update only succeeds for one worker
+        claimed = ScheduleJob.objects.filter(pk=job.pk, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job):
+    """Generate the schedule for a claimed job and record the outcome"""
+    trace = PlannerTrace()
+    try:
+        planner = StudyPlannerAlgorithm(job.user, strategy=job.strategy, trace=trace)
+        study_sessions = planner.generate_schedule(days=job.days)
+    except Exception as e:
+        logger.exception("Schedule job %s failed", job.pk)
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'done'
+        job.session_count = len(study_sessions)
+    job.trace = trace.as_dict()
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'session_count', 'trace', 'finished_at'])
+    logger.info(
+        "Schedule job %s %s in %.1f ms with %d queries: %s",
+        job.pk, job.status, job.trace['total_ms'], job.trace['queries'],
+        ', '.join(f"{name} {phase['ms']:.1f} ms" for name, phase in job.trace['phases'].items())
+    )
+    return job
+
+
+def run_next_job():
+    """Run the oldest pending job, returning it or None when the queue is empty"""
+    job = claim_next_job()
+    if job is None:
+        return None
+    return run_job(job)
@@ -0,0 +1,181 @@
+import datetime
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from planner.models import DailyLoad, Task, UserProfile
+from planner.scheduling_algorithm import (
+    DEFAULT_STRATEGY, StudyPlannerAlgorithm, TaskRow, get_strategy, rank_tasks_batch,
+)
+
+
+def plan_user(payload):
+    """Plan one user's prefetched data without touching the database"""
+    profile, tasks, sessions, daily_loads, keys, now, days, strategy = payload
+    planner = StudyPlannerAlgorithm(
+        profile.user, strategy, profile=profile, now=now, daily_loads=daily_loads
+    )
+    released = [session for session in sessions if planner.is_replaceable(session)]
+    chunks, _ = planner.plan_tasks(tasks, sessions, released, days, keys)
+    return profile.user_id, [(task.pk, start, end) for task, start, end in chunks]
+
+
+class Command(BaseCommand):
+    help = "Regenerate the study schedule of every user in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of planner processes (1 plans in this process)"
+        )
+        parser.add_argument(
+            '--since',
+            help="Only plan users with tasks changed since this ISO date or datetime"
+        )
+        parser.add_argument('--days', type=int, default=7, help="Days to plan ahead")
+        parser.add_argument('--chunk-size', type=int, default=200, help="Users loaded per batch")
+        parser.add_argument('--strategy', default=DEFAULT_STRATEGY, help="Scheduling strategy")
+
+    def handle(self, *args, **options):
+        try:
+            get_strategy(options['strategy'])
+        except ValueError as e:
+            raise CommandError(e)
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError("--workers and --chunk-size must be at least 1")
+
+        now = timezone.now()
+        user_ids = self.get_user_ids(options['since'])
+        total = len(user_ids)
+        self.stdout.write(f"Planning {total} users with {options['workers']} workers")
+
+        started = time.monotonic()
+        planned = 0
+        session_count = 0
+        executor = None
+        if options['workers'] > 1:
+            # Spawned workers never inherit the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=django.setup
+            )
+
+        try:
+            for offset in range(0, total, options['chunk_size']):
+                chunk = user_ids[offset:offset + options['chunk_size']]
+                planned_users, sessions = self.plan_chunk(
+                    chunk, now, options['days'], options['strategy'], executor
+                )
+                planned += planned_users
+                session_count += sessions
+                self.stdout.write(
+                    f"  {min(offset + len(chunk), total)}/{total} users, "
+                    f"{session_count} sessions written, {time.monotonic() - started:.1f}s"
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Planned {planned} users in {time.monotonic() - started:.1f}s "
+            f"({session_count} study sessions written)"
+        ))
+
+    def get_user_ids(self, since):
+        if not since:
+            return list(UserProfile.objects.order_by('user_id').values_list('user_id', flat=True))
+
+        since_dt = parse_datetime(since)
+        if since_dt is None:
+            since_date = parse_date(since)
+            if since_date is None:
+                raise CommandError(f"Invalid --since value: {since}")
+            since_dt = datetime.datetime.combine(since_date, datetime.time.min)
+        if timezone.is_naive(since_dt):
+            since_dt = timezone.make_aware(since_dt)
+
+        return list(
+            Task.objects.filter(updated_at__gte=since_dt, user__userprofile__isnull=False)
+            .order_by('user_id').values_list('user_id', flat=True).distinct()
+        )
+
+    def plan_chunk(self, user_ids, now, days, strategy, executor):
+        """Plan a batch of users and write their plans back in bulk.
+        
+        Tasks are read as plain rows and ranked for the whole batch in one
+        NumPy pass, so neither fetching nor scoring them runs per task model.
+        """
+        profiles = UserProfile.objects.filter(user_id__in=user_ids).select_related('user')
+        tasks = TaskRow.fetch(StudyPlannerAlgorithm.pending_tasks_query(now).filter(user_id__in=user_ids))
+        tasks_by_user = {}
+        for task in tasks:
+            tasks_by_user.setdefault(task.user_id, []).append(task)
+        sessions_by_user = {}
+        for session in StudyPlannerAlgorithm.sessions_query(now).filter(user_id__in=user_ids):
+            sessions_by_user.setdefault(session.user_id, []).append(session)
+        loads_by_user = {}
+        # Loads are per local day, which may be a day either side of UTC
+        first_day = now.date() - datetime.timedelta(days=1)
+        daily_loads = DailyLoad.objects.filter(
+            user_id__in=user_ids,
+            date__range=[first_day, first_day + datetime.timedelta(days=days + 2)]
+        ).values_list('user_id', 'date', 'scheduled_minutes')
+        for user_id, date, minutes in daily_loads:
+            loads_by_user.setdefault(user_id, {})[date] = minutes
+
+        planners = {
+            profile.user_id: StudyPlannerAlgorithm(profile.user, strategy, profile=profile, now=now)
+            for profile in profiles
+        }
+        released_by_user = {}
+        remaining = {}
+        for user_id, planner in planners.items():
+            sessions = sessions_by_user.get(user_id, [])
+            released = released_by_user[user_id] = [
+                session for session in sessions if planner.is_replaceable(session)
+            ]
+            remaining.update(planner.get_remaining(tasks_by_user.get(user_id, []), sessions, released))
+        ranked_ids, keys = rank_tasks_batch(tasks, now, strategy, remaining)
+        keys = dict(zip(ranked_ids.tolist(), keys.tolist()))
+
+        payloads = [
+            (
+                planner.profile,
+                tasks_by_user.get(user_id, []),
+                sessions_by_user.get(user_id, []),
+                loads_by_user.get(user_id, {}),
+                {task.pk: keys[task.pk] for task in tasks_by_user.get(user_id, [])},
+                now,
+                days,
+                strategy,
+            )
+            for user_id, planner in planners.items()
+        ]
+        if executor:
+            results = executor.map(plan_user, payloads, chunksize=max(1, len(payloads) // 32))
+        else:
+            results = map(plan_user, payloads)
+
+        new_sessions = []
+        stale_ids = []
+        for user_id, chunks in results:
+            tasks_by_id = {task.pk: task for task in tasks_by_user.get(user_id, [])}
+            _, created, stale = planners[user_id].diff_plan(
+                [(tasks_by_id[task_id], start, end) for task_id, start, end in chunks],
+                released_by_user[user_id]
+            )
+            new_sessions.extend(created)
+            stale_ids.extend(stale)
+
+        StudyPlannerAlgorithm.save_schedule(new_sessions, stale_ids)
+
+        return len(payloads), len(new_sessions)
@@ -0,0 +1,63 @@
+import cProfile
+import io
+import pstats
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from planner.models import UserProfile
+from planner.scheduling_algorithm import DEFAULT_STRATEGY, StudyPlannerAlgorithm, get_strategy
+from planner.tracing import PlannerTrace
+
+
+class Command(BaseCommand):
+    help = "Profile schedule generation for one user with cProfile"
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="Username or id of the user to plan")
+        parser.add_argument('--days', type=int, default=7, help="Days to plan ahead")
+        parser.add_argument('--strategy', default=DEFAULT_STRATEGY, help="Scheduling strategy")
+        parser.add_argument('--output', help="Write the raw profile here for snakeviz/pstats")
+        parser.add_argument(
+            '--sort', default='cumulative',
+            help="pstats sort key for the printed report"
+        )
+        parser.add_argument('--limit', type=int, default=30, help="Functions to print")
+        parser.add_argument(
+            '--commit', action='store_true',
+            help="Keep the generated schedule instead of rolling it back"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            get_strategy(options['strategy'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        lookup = {'pk': options['user']} if options['user'].isdigit() else {'username': options['user']}
+        try:
+            user = User.objects.get(**lookup)
+            planner = StudyPlannerAlgorithm(user, options['strategy'], trace=PlannerTrace())
+        except (User.DoesNotExist, UserProfile.DoesNotExist):
+            raise CommandError(f"No user with a profile matches {options['user']}")
+
+        profiler = cProfile.Profile()
+        with transaction.atomic():
+            profiler.enable()
+            try:
+                study_sessions = planner.generate_schedule(days=options['days'])
+            finally:
+                profiler.disable()
+            if not options['commit']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(f"Planned {len(study_sessions)} sessions for {user.username}\n")
+        self.stdout.write(planner.trace.format() + '\n')
+        if options['output']:
+            profiler.dump_stats(options['output'])
+            self.stdout.write(f"Profile written to {options['output']}")
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(report.getvalue())
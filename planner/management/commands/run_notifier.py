@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from planner.notifications import ConsoleSink, FileSink, MailSink, ReminderDispatcher
+
+
+class Command(BaseCommand):
+    help = "Send task and study session reminders as they fall due"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sink', choices=['console', 'file', 'mail'], default='console',
+            help="Where reminders go; 'mail' uses the configured EMAIL_BACKEND"
+        )
+        parser.add_argument('--output', help="File the 'file' sink appends JSON lines to")
+        parser.add_argument('--task-lead-hours', type=float, default=24)
+        parser.add_argument('--session-lead-minutes', type=float, default=15)
+        parser.add_argument('--horizon-minutes', type=float, default=60)
+        parser.add_argument(
+            '--refresh-seconds', type=float, default=30,
+            help="How often to load reminders changed by other processes"
+        )
+
+    def handle(self, *args, **options):
+        if options['sink'] == 'file':
+            if not options['output']:
+                raise CommandError("--output is required with --sink file")
+            sink = FileSink(options['output'])
+        elif options['sink'] == 'mail':
+            sink = MailSink()
+        else:
+            sink = ConsoleSink(self.stdout)
+
+        dispatcher = ReminderDispatcher(
+            sink,
+            task_lead=timedelta(hours=options['task_lead_hours']),
+            session_lead=timedelta(minutes=options['session_lead_minutes']),
+            horizon=timedelta(minutes=options['horizon_minutes']),
+            refresh_interval=timedelta(seconds=options['refresh_seconds']),
+        )
+        self.stdout.write("Reminder dispatcher started")
+        try:
+            dispatcher.run_forever()
+        except KeyboardInterrupt:
+            dispatcher.stop()
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from planner.jobs import run_next_job
+
+
+class Command(BaseCommand):
+    help = "Process queued schedule generation jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help="Seconds to wait between polls when the queue is empty"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Exit once the queue is empty instead of polling"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Schedule worker started")
+        while True:
+            # Like a request would, drop connections that are broken or past CONN_MAX_AGE
+            close_old_connections()
+            job = run_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            if job.status == 'done':
+                self.stdout.write(
+                    f"Job {job.pk}: {job.session_count} sessions for user {job.user_id} "
+                    f"in {job.trace['total_ms']:.0f} ms ({job.trace['queries']} queries)"
+                )
+            else:
+                self.stderr.write(f"Job {job.pk} failed: {job.error}")
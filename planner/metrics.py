@@ -0,0 +1,144 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds of the histogram buckets, in seconds and queries
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class QueryCounter:
+    """Database execute wrapper counting queries and the time spent in them"""
+
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One slot per bound plus the +Inf bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsCollector:
+    """Per-view request metrics for this process.
+
+    Every worker process keeps its own numbers, so scrape each of them (or
+    sum on the Prometheus side). Labels are URL pattern names rather than
+    paths, which keeps the number of series bounded.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.latency = {}
+            self.queries = {}
+            self.db_seconds = {}
+            self.responses = {}
+            self.over_budget = {}
+
+    def record(self, view, method, status, seconds, queries, db_seconds, over_budget):
+        key = (view, method)
+        with self.lock:
+            latency = self.latency.get(key)
+            if latency is None:
+                latency = self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+                self.db_seconds[key] = 0.0
+            latency.observe(seconds)
+            self.queries[key].observe(queries)
+            self.db_seconds[key] += db_seconds
+            status_key = (view, method, str(status))
+            self.responses[status_key] = self.responses.get(status_key, 0) + 1
+            if over_budget:
+                self.over_budget[key] = self.over_budget.get(key, 0) + 1
+
+    def render(self):
+        """The collected metrics in the Prometheus text exposition format"""
+        with self.lock:
+            lines = []
+            _histogram(
+                lines, 'planner_request_duration_seconds',
+                "Time from request to response, by view", self.latency
+            )
+            _histogram(
+                lines, 'planner_request_queries',
+                "Database queries per request, by view", self.queries
+            )
+            _counter(
+                lines, 'planner_request_db_seconds_total',
+                "Time spent in database queries, by view", self.db_seconds
+            )
+            _counter(
+                lines, 'planner_requests_total',
+                "Responses, by view and status code", self.responses,
+                labels=('view', 'method', 'status')
+            )
+            _counter(
+                lines, 'planner_query_budget_exceeded_total',
+                "Requests that ran more queries than the budget allows", self.over_budget
+            )
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _histogram(lines, name, help_text, histograms, labels=('view', 'method')):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items()):
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{{_labels(labels, key, le=_format_bound(bound))}}} {count}')
+        lines.append(f'{name}_sum{{{_labels(labels, key)}}} {histogram.sum!r}')
+        lines.append(f'{name}_count{{{_labels(labels, key)}}} {histogram.count}')
+
+
+def _counter(lines, name, help_text, values, labels=('view', 'method')):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{{{_labels(labels, key)}}} {value!r}')
+
+
+collector = MetricsCollector()
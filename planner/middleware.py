@@ -0,0 +1,115 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from .metrics import QueryCounter, collector
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """Record latency, query count and database time of every request.
+
+    Queries are counted with a database execute wrapper, which only adds a
+    counter and two clock reads per query. Streaming responses are measured
+    until their content has been sent, since that is when their queries run.
+    Requests over METRICS_QUERY_BUDGET queries (or the per-view budget in
+    METRICS_QUERY_BUDGETS) are logged and counted.
+
+    Under ASGI the counter is installed from the request's sync thread,
+    where the async ORM runs its queries; connections are per thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.default_budget = getattr(settings, 'METRICS_QUERY_BUDGET', 50)
+        self.budgets = getattr(settings, 'METRICS_QUERY_BUDGETS', {})
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        counter = QueryCounter()
+        wrapped = self.install(counter)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.uninstall(wrapped, counter)
+            raise
+        return self.track(request, response, started, counter, wrapped)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        counter = QueryCounter()
+        wrapped = await sync_to_async(self.install)(counter)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(self.uninstall)(wrapped, counter)
+            raise
+        if response.streaming:
+            return self.track(request, response, started, counter, wrapped)
+        return await sync_to_async(self.track)(request, response, started, counter, wrapped)
+
+    @staticmethod
+    def install(counter):
+        wrapped = list(connections.all())
+        for connection in wrapped:
+            connection.execute_wrappers.append(counter)
+        return wrapped
+
+    @staticmethod
+    def uninstall(wrapped, counter):
+        for connection in wrapped:
+            connection.execute_wrappers.remove(counter)
+
+    def track(self, request, response, started, counter, wrapped):
+        def finish(response):
+            self.uninstall(wrapped, counter)
+            self.record(request, response, time.perf_counter() - started, counter)
+
+        if not response.streaming:
+            finish(response)
+        elif response.is_async:
+            response.streaming_content = self.aobserve(response.streaming_content, response, finish)
+        else:
+            # Django consumes sync iterators in the request's sync thread
+            response.streaming_content = self.observe(response.streaming_content, response, finish)
+        return response
+
+    @staticmethod
+    def observe(content, response, finish):
+        try:
+            yield from content
+        finally:
+            finish(response)
+
+    @staticmethod
+    async def aobserve(content, response, finish):
+        try:
+            async for part in content:
+                yield part
+        finally:
+            await sync_to_async(finish)(response)
+
+    def record(self, request, response, seconds, counter):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        budget = self.budgets.get(view, self.default_budget)
+        over_budget = budget is not None and counter.count > budget
+        if over_budget:
+            logger.warning(
+                "%s %s ran %d queries (budget %d) in %.1f ms",
+                request.method, request.path, counter.count, budget, seconds * 1000
+            )
+        collector.record(
+            view, request.method, response.status_code, seconds,
+            counter.count, counter.seconds, over_budget
+        )
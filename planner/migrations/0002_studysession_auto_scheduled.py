@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+def mark_planner_sessions(apps, schema_editor):
+    StudySession = apps.get_model('planner', 'StudySession')
+    StudySession.objects.filter(
+        notes__startswith='Scheduled by AI planner'
+    ).update(auto_scheduled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studysession',
+            name='auto_scheduled',
+            field=models.BooleanField(default=False, help_text='Created by the planner and replaced when the schedule is regenerated'),
+        ),
+        migrations.RunPython(mark_planner_sessions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0003_schedulejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='calendar_version',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped whenever the user's tasks, courses or sessions change"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0006_deletedtask'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['start_time'], name='session_start_idx'),
+        ),
+    ]
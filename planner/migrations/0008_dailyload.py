@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:58
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_daily_loads(apps, schema_editor):
+    StudySession = apps.get_model('planner', 'StudySession')
+    DailyLoad = apps.get_model('planner', 'DailyLoad')
+    
+    loads = {}
+    sessions = StudySession.objects.values_list('user_id', 'start_time', 'end_time', 'completed')
+    for user_id, start_time, end_time, completed in sessions.iterator():
+        minutes = round((end_time - start_time).total_seconds() / 60)
+        load = loads.setdefault((user_id, start_time.astimezone(datetime.timezone.utc).date()), [0, 0])
+        load[0] += minutes
+        if completed:
+            load[1] += minutes
+    
+    DailyLoad.objects.bulk_create([
+        DailyLoad(user_id=user_id, date=date, scheduled_minutes=scheduled, completed_minutes=completed)
+        for (user_id, date), (scheduled, completed) in loads.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0007_reminder_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scheduled_minutes', models.IntegerField(default=0)),
+                ('completed_minutes', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_load')],
+            },
+        ),
+        migrations.RunPython(populate_daily_loads, migrations.RunPython.noop),
+    ]
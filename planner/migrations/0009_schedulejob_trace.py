@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0008_dailyload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedulejob',
+            name='trace',
+            field=models.JSONField(blank=True, help_text='Time and queries spent in each planner phase', null=True),
+        ),
+    ]
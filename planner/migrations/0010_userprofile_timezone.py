@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:04
+
+import planner.timezones
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0009_schedulejob_trace'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='timezone',
+            field=models.CharField(choices=planner.timezones.timezone_choices, default='UTC', help_text='Time zone the study hours are in', max_length=64, validators=[planner.timezones.validate_timezone]),
+        ),
+    ]
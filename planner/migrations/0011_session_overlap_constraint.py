@@ -0,0 +1,133 @@
+import heapq
+from zoneinfo import ZoneInfo
+
+from django.db import migrations
+from django.db.models import F
+from django.utils import timezone
+
+CONSTRAINT_NAME = 'session_no_overlap'
+
+
+def resolve_overlaps(apps, cutoff):
+    """Remove the overlaps the planner owns and report the rest.
+
+    Planner sessions that were never completed are deleted wherever they
+    overlap another session; the planner recreates the future ones on its
+    next run. Sessions the user created or completed are never changed.
+    Returns the ids of those that still overlap one another while running
+    after `cutoff`, which the constraint has to leave out.
+    """
+    StudySession = apps.get_model('planner', 'StudySession')
+    DailyLoad = apps.get_model('planner', 'DailyLoad')
+    UserProfile = apps.get_model('planner', 'UserProfile')
+    sessions = StudySession.objects.order_by('user_id', 'start_time', 'id').values_list(
+        'id', 'user_id', 'start_time', 'end_time', 'auto_scheduled', 'completed'
+    )
+    doomed = set()
+    legacy = set()
+    # (sign, user_id, start, end, completed) for DailyLoad
+    changes = []
+    active = []
+    current_user = None
+    for pk, user_id, start, end, auto_scheduled, completed in sessions.iterator():
+        if user_id != current_user:
+            current_user, active = user_id, []
+        disposable = auto_scheduled and not completed
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        if active and disposable:
+            doomed.add(pk)
+            changes.append((-1, user_id, start, end, completed))
+            continue
+        for other_end, other_pk, other_start, other_disposable, other_completed in active:
+            if other_disposable:
+                doomed.add(other_pk)
+                changes.append((-1, user_id, other_start, other_end, other_completed))
+        active = [entry for entry in active if entry[1] not in doomed]
+        heapq.heapify(active)
+
+        if end > cutoff:
+            clashes = [entry[1] for entry in active if entry[0] > cutoff]
+            if clashes:
+                legacy.update(clashes)
+                legacy.add(pk)
+        heapq.heappush(active, (end, pk, start, disposable, completed))
+
+    doomed = list(doomed)
+    for offset in range(0, len(doomed), 1000):
+        StudySession.objects.filter(pk__in=doomed[offset:offset + 1000]).delete()
+
+    # Historical models send no signals, so DailyLoad and the calendar
+    # versions are updated here
+    user_ids = {change[1] for change in changes}
+    zones = dict(
+        UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'timezone')
+    )
+    deltas = {}
+    for sign, user_id, start, end, completed in changes:
+        date = start.astimezone(ZoneInfo(zones.get(user_id, 'UTC'))).date()
+        minutes = sign * round((end - start).total_seconds() / 60)
+        delta = deltas.setdefault((user_id, date), [0, 0])
+        delta[0] += minutes
+        if completed:
+            delta[1] += minutes
+    for (user_id, date), (scheduled, completed) in deltas.items():
+        if not scheduled and not completed:
+            continue
+        updated = DailyLoad.objects.filter(user_id=user_id, date=date).update(
+            scheduled_minutes=F('scheduled_minutes') + scheduled,
+            completed_minutes=F('completed_minutes') + completed
+        )
+        if not updated and scheduled > 0:
+            DailyLoad.objects.create(
+                user_id=user_id, date=date, scheduled_minutes=scheduled, completed_minutes=completed
+            )
+    UserProfile.objects.filter(user_id__in=user_ids).update(
+        calendar_version=F('calendar_version') + 1
+    )
+    return sorted(legacy)
+
+
+def add_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        # Elsewhere overlaps are checked by the views with indexed lookups
+        return
+    StudySession = apps.get_model('planner', 'StudySession')
+    cutoff = timezone.now()
+    legacy = resolve_overlaps(apps, cutoff)
+
+    table = schema_editor.quote_name(StudySession._meta.db_table)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # Only sessions running after the migration are covered, so old
+    # overlaps kept as history do not block it. Overlapping sessions the
+    # user made are left out too rather than being changed behind their
+    # back. Deferred so a session and the planned sessions it displaces can
+    # be rewritten in one transaction
+    where = f"end_time > '{cutoff.isoformat()}'::timestamptz"
+    if legacy:
+        where += f" AND id NOT IN ({', '.join(map(str, legacy))})"
+    schema_editor.execute(
+        f'ALTER TABLE {table} ADD CONSTRAINT {CONSTRAINT_NAME} '
+        f"EXCLUDE USING gist (user_id WITH =, tstzrange(start_time, end_time, '[)') WITH &&) "
+        f'WHERE ({where}) '
+        f'DEFERRABLE INITIALLY DEFERRED'
+    )
+
+
+def remove_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    StudySession = apps.get_model('planner', 'StudySession')
+    table = schema_editor.quote_name(StudySession._meta.db_table)
+    schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {CONSTRAINT_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0010_userprofile_timezone'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_overlap_constraint, remove_overlap_constraint),
+    ]
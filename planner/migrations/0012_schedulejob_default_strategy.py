@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planner', '0011_session_overlap_constraint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='schedulejob',
+            name='strategy',
+            field=models.CharField(default='least_slack', max_length=20),
+        ),
+    ]
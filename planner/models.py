@@ -2,6 +2,7 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 import datetime
+from .timezones import timezone_choices, validate_timezone
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -22,6 +23,24 @@ class UserProfile(models.Model):
         validators=[MinValueValidator(1.0), MaxValueValidator(12.0)],
         help_text="Daily study hours target"
     )
+    timezone = models.CharField(
+        max_length=64,
+        default='UTC',
+        choices=timezone_choices,
+        validators=[validate_timezone],
+        help_text="Time zone the study hours are in"
+    )
+    calendar_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Bumped whenever the user's tasks, courses or sessions change"
+    )
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so DailyLoad can be rebuilt when the zone changes
+        instance._loaded_timezone = instance.__dict__.get('timezone')
+        return instance
     
     def __str__(self):
         return f"{self.user.username}'s Profile"
@@ -65,10 +84,20 @@ class Task(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     class Meta:
         ordering = ['due_date']
+        indexes = [
+            # Planner: a user's open tasks by deadline
+            models.Index(fields=['user', 'status', 'due_date'], name='task_user_status_due_idx'),
+            # Calendar feed: a user's deadlines in a date range
+            models.Index(fields=['user', 'due_date'], name='task_user_due_idx'),
+            # Notification API: open tasks of every user due in a window.
+            # Not a partial index as SQLite cannot match one against the
+            # bound parameters of a status__in filter.
+            models.Index(fields=['due_date', 'status'], name='task_due_status_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -82,9 +111,103 @@ class StudySession(models.Model):
     end_time = models.DateTimeField()
     completed = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
+    auto_scheduled = models.BooleanField(
+        default=False,
+        help_text="Created by the planner and replaced when the schedule is regenerated"
+    )
     
     class Meta:
         ordering = ['start_time']
+        indexes = [
+            # Planner clean-up and calendar feed: a user's sessions by time
+            models.Index(fields=['user', 'start_time', 'completed'], name='session_user_start_done_idx'),
+            # Reminder dispatcher: every user's sessions starting soon
+            models.Index(fields=['start_time'], name='session_start_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so DailyLoad can subtract the old values on save
+        if {'user_id', 'start_time', 'end_time', 'completed'} <= set(field_names):
+            instance._loaded_load = instance.load_contribution()
+        return instance
+    
+    def load_contribution(self):
+        """Return (user_id, start_time, minutes, completed minutes) for DailyLoad.
+        
+        The start time is resolved to a day in the user's time zone later.
+        """
+        if self.start_time is None or self.end_time is None:
+            return None
+        minutes = round((self.end_time - self.start_time).total_seconds() / 60)
+        return (
+            self.user_id,
+            self.start_time,
+            minutes,
+            minutes if self.completed else 0,
+        )
+    
+    def __str__(self):
+        return f"{self.title} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
+
+class DailyLoad(models.Model):
+    """Study minutes per user and local day, kept up to date as sessions change"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    scheduled_minutes = models.IntegerField(default=0)
+    completed_minutes = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_daily_load'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} {self.date}: {self.scheduled_minutes} min"
+
+class ScheduleJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    strategy = models.CharField(max_length=20, default='least_slack')
+    days = models.IntegerField(default=7)
+    session_count = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    trace = models.JSONField(
+        null=True, blank=True,
+        help_text="Time and queries spent in each planner phase"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            # Repeated requests for the same user share one pending job
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_schedule_job'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Schedule job {self.pk} for {self.user.username} ({self.status})"
+
+class DeletedTask(models.Model):
+    """Tombstone so delta syncs of the upcoming tasks API can report deletions"""
+    # Not a foreign key: the task is gone and the user may be deleted with it
+    task_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
     def __str__(self):
-        return f"{self.title} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"Task {self.task_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
\ No newline at end of file
@@ -0,0 +1,222 @@
+import heapq
+import json
+import logging
+import threading
+import weakref
+from datetime import timedelta
+
+from django.core.mail import send_mail
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import StudySession, Task
+
+logger = logging.getLogger(__name__)
+
+# Dispatchers running in this process, woken by model signals
+_dispatchers = weakref.WeakSet()
+
+
+def notify_dispatchers(instance):
+    """Tell running dispatchers that a task or session changed"""
+    for dispatcher in list(_dispatchers):
+        dispatcher.changed(instance)
+
+
+class ConsoleSink:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def send(self, reminder):
+        self.stream.write(f"NOTIFICATION to {reminder['email']}: {reminder['message']}\n")
+
+
+class FileSink:
+    """Appends one JSON object per reminder, for offline testing"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, reminder):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(reminder) + '\n')
+
+
+class MailSink:
+    """Sends reminders through Django's configured EMAIL_BACKEND"""
+
+    def send(self, reminder):
+        if reminder['email']:
+            send_mail('Study planner reminder', reminder['message'], None, [reminder['email']])
+
+
+class ReminderDispatcher:
+    """Fires reminders from a time-ordered heap of upcoming instants.
+
+    Only reminders due within `horizon` are kept in the heap. They are loaded
+    with indexed range queries on Task.due_date and StudySession.start_time,
+    re-checked against the database just before they fire, and sent at most
+    once per event time. Changes made in this process arrive through model
+    signals; changes from other processes are picked up on each refresh.
+    """
+
+    def __init__(self, sink, task_lead=timedelta(hours=24), session_lead=timedelta(minutes=15),
+                 horizon=timedelta(hours=1), refresh_interval=timedelta(seconds=30)):
+        self.sink = sink
+        self.task_lead = task_lead
+        self.session_lead = session_lead
+        self.horizon = horizon
+        self.refresh_interval = refresh_interval
+
+        self.heap = []
+        self.queued = set()
+        self.sent = set()
+        self.started_at = timezone.now()
+        self.refreshed_at = None
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.lock = threading.Lock()
+        _dispatchers.add(self)
+
+    def push(self, kind, pk, event_time):
+        lead = self.task_lead if kind == 'task' else self.session_lead
+        key = (kind, pk, event_time)
+        with self.lock:
+            if key in self.queued or key in self.sent:
+                return
+            self.queued.add(key)
+            heapq.heappush(self.heap, (event_time - lead, key))
+        self.wakeup.set()
+
+    def changed(self, instance):
+        """Queue a reminder for a task or session saved in this process"""
+        now = timezone.now()
+        # Later reminders are loaded by refresh once they enter the horizon
+        if isinstance(instance, Task):
+            if (instance.status != 'completed' and instance.due_date > now
+                    and instance.due_date - self.task_lead < now + self.horizon):
+                self.push('task', instance.pk, instance.due_date)
+        elif isinstance(instance, StudySession):
+            if (not instance.completed and instance.start_time > now
+                    and instance.start_time - self.session_lead < now + self.horizon):
+                self.push('session', instance.pk, instance.start_time)
+
+    def refresh(self, now):
+        """Load reminders that fall due within the horizon"""
+        # Skip events whose reminders were due before this dispatcher started
+        task_from = max(now, self.started_at + self.task_lead)
+        tasks = Task.objects.filter(
+            status__in=['pending', 'in_progress'],
+            due_date__gte=task_from,
+            due_date__lt=now + self.horizon + self.task_lead
+        ).values_list('id', 'due_date')
+        for pk, due_date in tasks:
+            self.push('task', pk, due_date)
+
+        if self.refreshed_at:
+            # Tasks created or moved elsewhere with reminders already due
+            changed = Task.objects.filter(
+                updated_at__gte=self.refreshed_at - timedelta(seconds=5),
+                status__in=['pending', 'in_progress'],
+                due_date__gt=now,
+                due_date__lt=now + self.horizon + self.task_lead
+            ).values_list('id', 'due_date')
+            for pk, due_date in changed:
+                self.push('task', pk, due_date)
+
+        session_from = max(now, self.started_at + self.session_lead)
+        sessions = StudySession.objects.filter(
+            completed=False,
+            start_time__gte=session_from,
+            start_time__lt=now + self.horizon + self.session_lead
+        ).values_list('id', 'start_time')
+        for pk, start_time in sessions:
+            self.push('session', pk, start_time)
+
+        self.refreshed_at = now
+        # Forget sent reminders for events that are over
+        self.sent = {key for key in self.sent if key[2] > now}
+
+    def pop_due(self, now):
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, key = heapq.heappop(self.heap)
+                self.queued.discard(key)
+                due.append(key)
+        return due
+
+    def fire(self, keys):
+        """Send reminders for keys whose task or session is unchanged"""
+        task_ids = [pk for kind, pk, _ in keys if kind == 'task']
+        session_ids = [pk for kind, pk, _ in keys if kind == 'session']
+        tasks = {
+            task.pk: task
+            for task in Task.objects.filter(pk__in=task_ids).select_related('user')
+        } if task_ids else {}
+        sessions = {
+            session.pk: session
+            for session in StudySession.objects.filter(pk__in=session_ids).select_related('user')
+        } if session_ids else {}
+
+        for key in keys:
+            kind, pk, event_time = key
+            if kind == 'task':
+                task = tasks.get(pk)
+                if task is None or task.status == 'completed' or task.due_date != event_time:
+                    continue
+                reminder = {
+                    'kind': kind,
+                    'id': pk,
+                    'email': task.user.email,
+                    'at': event_time.isoformat(),
+                    'message': f"Reminder: Task '{task.title}' is due on "
+                               f"{timezone.localtime(event_time):%b %d, %Y %H:%M}",
+                }
+            else:
+                session = sessions.get(pk)
+                if session is None or session.completed or session.start_time != event_time:
+                    continue
+                reminder = {
+                    'kind': kind,
+                    'id': pk,
+                    'email': session.user.email,
+                    'at': event_time.isoformat(),
+                    'message': f"Reminder: Study session '{session.title}' starts at "
+                               f"{timezone.localtime(event_time):%b %d, %Y %H:%M}",
+                }
+            try:
+                self.sink.send(reminder)
+            except Exception:
+                logger.exception("Could not send reminder %s", key)
+                continue
+            self.sent.add(key)
+
+    def run_pending(self):
+        """Refresh if due and fire every reminder whose time has come"""
+        now = timezone.now()
+        if self.refreshed_at is None or now - self.refreshed_at >= self.refresh_interval:
+            self.refresh(now)
+        due = self.pop_due(now)
+        if due:
+            self.fire(due)
+
+    def seconds_until_next(self):
+        now = timezone.now()
+        timeout = self.refresh_interval
+        with self.lock:
+            if self.heap:
+                timeout = min(timeout, self.heap[0][0] - now)
+        return max(0, timeout.total_seconds())
+
+    def run_forever(self):
+        while not self.stopped:
+            close_old_connections()
+            self.run_pending()
+            self.wakeup.wait(self.seconds_until_next())
+            self.wakeup.clear()
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+        _dispatchers.discard(self)
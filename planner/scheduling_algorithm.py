@@ -1,13 +1,281 @@
-import datetime
+import heapq
 from datetime import timedelta
-from .models import Task, StudySession, UserProfile
+import numpy as np
+from .calendar_feed import bump_calendar_version, calendar_changes
+from .conflicts import is_replaceable
+from .daily_load import daily_load_changes, record_sessions_created
+from .free_time import FreeTimeIndex
+from .models import DailyLoad, Task, StudySession, UserProfile
+from .timezones import day_bounds, local_date, local_window
+from .tracing import NULL_TRACE
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 
+
+MICROSECOND = timedelta(microseconds=1)
+MICROSECONDS_PER_MINUTE = 60 * 10 ** 6
+# Rows per query when a plan diff is written
+SAVE_BATCH_SIZE = 1000
+
+
+def microseconds(delta):
+    """A timedelta as a whole number of microseconds"""
+    return delta // MICROSECOND
+
+
+class PlannedTask:
+    """Lightweight scheduling state for one task.
+    
+    Times are whole microseconds from the start of planning, so chunks add
+    up and convert back to datetimes exactly.
+    """
+    __slots__ = ('task', 'deadline', 'remaining', 'priority')
+    
+    def __init__(self, task, deadline, remaining, priority):
+        self.task = task
+        self.deadline = deadline
+        self.remaining = remaining
+        self.priority = priority
+
+
+class TaskRow:
+    """The task columns the planner reads, fetched without a model instance"""
+    __slots__ = ('pk', 'user_id', 'title', 'course_id', 'due_date', 'priority', 'estimated_duration')
+    columns = ('id', 'user_id', 'title', 'course_id', 'due_date', 'priority', 'estimated_duration')
+    
+    def __init__(self, pk, user_id, title, course_id, due_date, priority, estimated_duration):
+        self.pk = pk
+        self.user_id = user_id
+        self.title = title
+        self.course_id = course_id
+        self.due_date = due_date
+        self.priority = priority
+        self.estimated_duration = estimated_duration
+    
+    @classmethod
+    def fetch(cls, tasks):
+        """TaskRows for a Task queryset, read with values_list"""
+        return [cls(*row) for row in tasks.values_list(*cls.columns)]
+
+
+def _weighted_scores(seconds_until_due, priority):
+    time_until_due = seconds_until_due / 3600  # hours until due
+    return priority * 0.4 + (1 / np.maximum(1, time_until_due)) * 0.6
+
+
+def score_task_rows(rows, now):
+    """Score (due_date, priority) rows in bulk.
+    
+    Vectorized form of StudyPlannerAlgorithm.calculate_task_score, which
+    stays the reference implementation.
+    """
+    due = np.fromiter(((row[0] - now).total_seconds() for row in rows), dtype=np.float64, count=len(rows))
+    priority = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    return _weighted_scores(due, priority)
+
+
+class SchedulingStrategy:
+    """Decides which task gets the next free time; lower keys go first"""
+    name = None
+    # Set when keys change as simulated time advances, so the engine re-scores
+    time_dependent = False
+    
+    def key(self, planned, now):
+        raise NotImplementedError
+    
+    def batch_keys(self, deadlines, remaining, priorities):
+        """key() at time 0 for arrays of deadlines, remaining microseconds and priorities"""
+        return np.array([
+            self.key(PlannedTask(None, deadline, left, priority), 0)
+            for deadline, left, priority in zip(deadlines, remaining, priorities)
+        ], dtype=np.float64)
+
+
+class EarliestDeadlineFirst(SchedulingStrategy):
+    name = 'edf'
+    
+    def key(self, planned, now):
+        return planned.deadline
+    
+    def batch_keys(self, deadlines, remaining, priorities):
+        return deadlines
+
+
+class WeightedPriority(SchedulingStrategy):
+    """Same weighting as StudyPlannerAlgorithm.calculate_task_score.
+    
+    The deadline term only outweighs a step in priority within a couple of
+    hours of the deadline, so a low-priority task due soon can be starved
+    by higher-priority work due later.
+    """
+    name = 'weighted'
+    time_dependent = True
+    
+    def key(self, planned, now):
+        time_until_due = (planned.deadline - now) / 3.6e9  # hours until due
+        return -(planned.priority * 0.4 + (1 / max(1, time_until_due)) * 0.6)
+    
+    def batch_keys(self, deadlines, remaining, priorities):
+        return -_weighted_scores(deadlines / 1e6, priorities)
+
+
+class LeastSlack(SchedulingStrategy):
+    name = 'least_slack'
+    
+    def key(self, planned, now):
+        # Slack is deadline - now - remaining; "now" is shared by every task
+        return planned.deadline - planned.remaining
+    
+    def batch_keys(self, deadlines, remaining, priorities):
+        return deadlines - remaining
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (EarliestDeadlineFirst, WeightedPriority, LeastSlack)
+}
+
+# Meets every deadline that can be met with the free time available
+DEFAULT_STRATEGY = LeastSlack.name
+
+
+def get_strategy(strategy):
+    """Return a strategy instance from a name, class or instance"""
+    if isinstance(strategy, str):
+        try:
+            strategy = STRATEGIES[strategy]
+        except KeyError:
+            raise ValueError(f"Unknown scheduling strategy: {strategy}")
+    if isinstance(strategy, type):
+        strategy = strategy()
+    return strategy
+
+
+def rank_tasks_batch(tasks, now, strategy=DEFAULT_STRATEGY, remaining=None):
+    """Rank tasks best first with one NumPy pass over their columns.
+    
+    `tasks` are TaskRows or Task instances and `remaining` maps task ids to
+    the minutes still to schedule, as for SchedulingEngine.plan. Returns the
+    task ids and their strategy keys at `now`, both in rank order; the keys
+    can seed SchedulingEngine.plan so it does not score tasks one by one.
+    """
+    strategy = get_strategy(strategy)
+    count = len(tasks)
+    ids = np.fromiter((task.pk for task in tasks), dtype=np.int64, count=count)
+    deadlines = np.fromiter(
+        (microseconds(task.due_date - now) for task in tasks), dtype=np.float64, count=count
+    )
+    minutes = np.fromiter(
+        (
+            task.estimated_duration if remaining is None else remaining.get(task.pk, 0)
+            for task in tasks
+        ),
+        dtype=np.float64, count=count
+    )
+    priorities = np.fromiter((task.priority for task in tasks), dtype=np.float64, count=count)
+    
+    keys = strategy.batch_keys(deadlines, np.round(minutes * MICROSECONDS_PER_MINUTE), priorities)
+    order = np.argsort(keys, kind='stable')
+    return ids[order], keys[order]
+
+
+class SchedulingEngine:
+    """Heap-based planner that walks free time in chronological order.
+    
+    Every free interval goes to the task at the top of the heap, and a task
+    is never placed past its deadline. Time-dependent strategies are
+    re-scored whenever the simulated clock moves on by `rescore_interval`.
+    """
+    
+    def __init__(self, strategy=DEFAULT_STRATEGY, rescore_interval=timedelta(days=1)):
+        self.strategy = get_strategy(strategy)
+        self.rescore_interval = microseconds(rescore_interval)
+    
+    def plan(self, tasks, free_time, now, remaining=None, keys=None):
+        """Return (task, start, end) chunks for `tasks` within `free_time`.
+        
+        `remaining` maps task ids to the minutes still to schedule and
+        defaults to each task's estimated duration. `keys` maps task ids to
+        their starting keys, as computed by rank_tasks_batch. Times are
+        tracked as whole microseconds from `now`, so every chunk is at least
+        a microsecond long and converts back to datetimes exactly.
+        """
+        key = self.strategy.key
+        
+        heap = []
+        for seq, task in enumerate(tasks):
+            minutes = task.estimated_duration if remaining is None else remaining.get(task.pk, 0)
+            if minutes <= 0:
+                continue
+            planned = PlannedTask(
+                task, microseconds(task.due_date - now), round(minutes * MICROSECONDS_PER_MINUTE),
+                task.priority
+            )
+            heap.append((key(planned, 0) if keys is None else keys[task.pk], seq, planned))
+        heapq.heapify(heap)
+        
+        chunks = []
+        rescore_at = self.rescore_interval
+        
+        for interval_start, interval_end in free_time:
+            if not heap:
+                break
+            t = microseconds(interval_start - now)
+            end = microseconds(interval_end - now)
+            
+            if self.strategy.time_dependent and t >= rescore_at:
+                heap = [(key(planned, t), seq, planned) for _, seq, planned in heap]
+                heapq.heapify(heap)
+                rescore_at = t + self.rescore_interval
+            
+            while t < end and heap:
+                _, seq, planned = heap[0]
+                if planned.deadline <= t:
+                    # Too late to work on this task any more
+                    heapq.heappop(heap)
+                    continue
+                
+                used = min(planned.remaining, end - t, planned.deadline - t)
+                chunks.append((planned.task, t, t + used))
+                planned.remaining -= used
+                t += used
+                
+                if planned.remaining <= 0:
+                    heapq.heappop(heap)
+                else:
+                    heapq.heapreplace(heap, (key(planned, t), seq, planned))
+        
+        return [
+            (task, now + start * MICROSECOND, now + end * MICROSECOND)
+            for task, start, end in chunks
+        ]
+
+
 class StudyPlannerAlgorithm:
-    def __init__(self, user):
+    def __init__(self, user, strategy=DEFAULT_STRATEGY, profile=None, now=None, daily_loads=None,
+                 trace=None):
         self.user = user
-        self.profile = UserProfile.objects.get(user=user)
-        self.now = timezone.now()
+        self.profile = profile or UserProfile.objects.get(user=user)
+        self.now = now or timezone.now()
+        self.strategy = get_strategy(strategy)
+        # Scheduled minutes per date, loaded from DailyLoad when first needed
+        self.daily_loads = daily_loads
+        # A PlannerTrace records the time and queries of each phase
+        self.trace = trace or NULL_TRACE
+    
+    @staticmethod
+    def pending_tasks_query(now):
+        """Tasks the planner schedules: not completed and not yet due"""
+        return Task.objects.filter(
+            status__in=['pending', 'in_progress'],
+            due_date__gte=now
+        ).order_by('due_date')
+    
+    @staticmethod
+    def sessions_query(now):
+        """Sessions that block time or count as work done on a task"""
+        return StudySession.objects.filter(Q(end_time__gt=now) | Q(completed=True))
     
     def calculate_task_score(self, task):
         """Calculate a priority score for a task based on deadline and priority"""
@@ -21,105 +289,293 @@ class StudyPlannerAlgorithm:
     
     def generate_schedule(self, days=7):
         """Generate a study schedule for the next specified days"""
-        # Clear existing non-completed study sessions
-        StudySession.objects.filter(
-            user=self.user, 
-            start_time__gte=self.now,
-            completed=False
-        ).delete()
-        
-        # Get all pending tasks
-        tasks = Task.objects.filter(
-            user=self.user, 
-            status__in=['pending', 'in_progress'],
-            due_date__gte=self.now
-        ).order_by('due_date')
+        sessions = self.get_sessions()
+        released = [session for session in sessions if self.is_replaceable(session)]
+        return self.replan(self.get_pending_tasks(), sessions, released, days)
+    
+    def reschedule(self, task_ids, days=7):
+        """Re-plan only the given tasks, plus any sessions they displace.
+        
+        Planned sessions of other tasks stay where they are unless a changed
+        task no longer fits before its deadline. In that case lower-ranked
+        sessions ahead of the deadline are released and re-planned as well.
+        """
+        task_ids = set(task_ids)
+        tasks = self.get_pending_tasks()
+        sessions = self.get_sessions()
+        replaceable = [session for session in sessions if self.is_replaceable(session)]
+        released = [session for session in replaceable if session.task_id in task_ids]
+        affected = [task for task in tasks if task.pk in task_ids]
         
-        if not tasks:
+        chunks, remaining = self.plan_tasks(affected, sessions, released, days)
+        short = [
+            task for task in affected
+            if round(remaining.get(task.pk, 0) * MICROSECONDS_PER_MINUTE) > 0
+        ]
+        if not short:
+            return self.apply_plan(chunks, released)
+        
+        # Give the tasks that came up short the sessions of lower-ranked tasks
+        ranks = self.rank_tasks(tasks, self.get_remaining(tasks, sessions, released))
+        tasks_by_id = {task.pk: task for task in tasks}
+        displaced = [
+            session for session in replaceable
+            if session.task_id not in task_ids
+            and session.task_id in tasks_by_id
+            and any(
+                session.start_time < task.due_date and ranks[session.task_id] > ranks[task.pk]
+                for task in short
+            )
+        ]
+        task_ids.update(session.task_id for session in displaced)
+        released.extend(displaced)
+        affected = [task for task in tasks if task.pk in task_ids]
+        return self.replan(affected, sessions, released, days)
+    
+    def reschedule_around(self, session, days=7):
+        """Re-plan the planned sessions that overlap `session`"""
+        return self.reschedule_around_sessions([session], days)
+    
+    def reschedule_around_sessions(self, sessions, days=7):
+        """Re-plan the planned sessions that overlap any of `sessions` at once"""
+        overlaps = Q()
+        for session in sessions:
+            overlaps |= Q(start_time__lt=session.end_time, end_time__gt=session.start_time)
+        task_ids = StudySession.objects.filter(
+            overlaps,
+            user=self.user,
+            auto_scheduled=True,
+            completed=False,
+            start_time__gte=self.now
+        ).exclude(pk__in=[session.pk for session in sessions]).values_list('task_id', flat=True)
+        
+        with self.trace.phase('overlaps'):
+            task_ids = set(task_ids)
+        if not task_ids:
             return []
+        return self.reschedule(task_ids, days)
+    
+    def get_pending_tasks(self):
+        """Get all pending tasks that are not yet due"""
+        with self.trace.phase('tasks'):
+            tasks = list(self.pending_tasks_query(self.now).filter(user=self.user))
+        self.trace.count('tasks_considered', len(tasks))
+        return tasks
+    
+    def get_sessions(self):
+        """Get sessions that block time or count as work done on a task"""
+        with self.trace.phase('sessions'):
+            sessions = list(self.sessions_query(self.now).filter(user=self.user))
+        self.trace.count('sessions_loaded', len(sessions))
+        return sessions
+    
+    def is_replaceable(self, session):
+        """Whether a session is part of the plan the planner may rewrite"""
+        return is_replaceable(session, self.now)
+    
+    def get_remaining(self, tasks, sessions, released):
+        """Minutes still to schedule per task once kept sessions are counted"""
+        released_ids = {session.pk for session in released}
+        covered = {}
+        for session in sessions:
+            if session.task_id is None or session.pk in released_ids:
+                continue
+            covered[session.task_id] = covered.get(session.task_id, 0) + microseconds(
+                session.end_time - session.start_time
+            )
+        return {
+            task.pk: task.estimated_duration - covered.get(task.pk, 0) / MICROSECONDS_PER_MINUTE
+            for task in tasks
+        }
+    
+    def rank_tasks(self, tasks, remaining):
+        """Map task ids to the strategy's key for them right now"""
+        return {
+            task.pk: self.strategy.key(
+                PlannedTask(
+                    task,
+                    microseconds(task.due_date - self.now),
+                    round(remaining[task.pk] * MICROSECONDS_PER_MINUTE),
+                    task.priority
+                ),
+                0
+            )
+            for task in tasks
+        }
+    
+    def plan_tasks(self, tasks, sessions, released, days=7, keys=None):
+        """Plan `tasks` around every session that is not being released.
         
-        # Calculate priority scores for all tasks
-        task_scores = [(task, self.calculate_task_score(task)) for task in tasks]
-        task_scores.sort(key=lambda x: x[1], reverse=True)
+        `keys` optionally holds the tasks' starting keys from
+        rank_tasks_batch. Returns the planned chunks and the minutes each
+        task still lacks.
+        """
+        released_ids = {session.pk for session in released}
+        busy = [
+            (session.start_time, session.end_time)
+            for session in sessions
+            if session.pk not in released_ids and session.end_time > self.now
+        ]
+        budgets = self.get_daily_budgets(released, days)
+        with self.trace.phase('slots'):
+            free_time = self.build_free_time_index(days, busy, budgets)
+        self.trace.count('slots_generated', len(free_time))
         
-        # Generate time slots for each day
+        with self.trace.phase('plan'):
+            remaining = self.get_remaining(tasks, sessions, released)
+            chunks = SchedulingEngine(self.strategy).plan(tasks, free_time, self.now, remaining, keys)
+            
+            for task, session_start, session_end in chunks:
+                remaining[task.pk] -= microseconds(session_end - session_start) / MICROSECONDS_PER_MINUTE
+        self.trace.count('tasks_planned', len(tasks))
+        self.trace.count('chunks_planned', len(chunks))
+        return chunks, remaining
+    
+    def replan(self, tasks, sessions, released, days=7):
+        """Plan `tasks` into the time freed by `released` and persist the diff"""
+        chunks, _ = self.plan_tasks(tasks, sessions, released, days)
+        return self.apply_plan(chunks, released)
+    
+    def apply_plan(self, chunks, released):
+        """Persist planned chunks, reusing released sessions that did not move.
+        
+        Returns every session in the new plan, in chronological order.
+        """
+        with self.trace.phase('diff'):
+            study_sessions, new_sessions, stale_ids = self.diff_plan(chunks, released)
+        with self.trace.phase('save'):
+            self.save_schedule(new_sessions, stale_ids)
+        self.trace.count('sessions_written', len(new_sessions))
+        self.trace.count('sessions_deleted', len(stale_ids))
+        self.trace.count('sessions_kept', len(study_sessions) - len(new_sessions))
+        return study_sessions
+    
+    def diff_plan(self, chunks, released):
+        """Match planned chunks against the released sessions.
+        
+        Returns the full plan in chronological order, the sessions that need
+        to be created and the ids of released sessions that were not reused.
+        """
+        unchanged = {
+            (session.task_id, session.start_time, session.end_time): session
+            for session in released
+        }
         study_sessions = []
-        current_date = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        new_sessions = []
         
-        for day in range(days):
-            day_date = current_date + timedelta(days=day)
-            
+        for task, session_start, session_end in chunks:
+            session = unchanged.pop((task.pk, session_start, session_end), None)
+            if session is None:
+                session = StudySession(
+                    user=self.user,
+                    task_id=task.pk,
+                    course_id=task.course_id,
+                    title=f"Study: {task.title}",
+                    start_time=session_start,
+                    end_time=session_end,
+                    notes=f"Scheduled by AI planner for {task.title}",
+                    auto_scheduled=True
+                )
+                new_sessions.append(session)
+            study_sessions.append(session)
+        
+        study_sessions.sort(key=lambda session: session.start_time)
+        return study_sessions, new_sessions, [session.pk for session in unchanged.values()]
+    
+    def get_daily_loads(self, days=7):
+        """Scheduled minutes per date over the planning horizon"""
+        if self.daily_loads is None:
+            today = self.today()
+            with self.trace.phase('daily_loads'):
+                self.daily_loads = dict(DailyLoad.objects.filter(
+                    user=self.user,
+                    date__range=[today, today + timedelta(days=days)]
+                ).values_list('date', 'scheduled_minutes'))
+        return self.daily_loads
+    
+    def get_daily_budgets(self, released, days=7):
+        """Minutes that may still be planned per date under daily_study_hours.
+        
+        Sessions being released are about to be replaced, so they do not
+        count against the day they are on.
+        """
+        loads = dict(self.get_daily_loads(days))
+        for session in released:
+            date = local_date(session.start_time, self.profile.timezone)
+            loads[date] = loads.get(date, 0) - session.load_contribution()[2]
+        
+        cap = self.profile.daily_study_hours * 60
+        return {date: max(0, cap - minutes) for date, minutes in loads.items()}
+    
+    def build_free_time_index(self, days=7, busy=(), budgets=None):
+        """Build the free time available over the planning horizon.
+        
+        Seeded from the profile's study hours, with the `busy` (start, end)
+        intervals carved out. Days with an entry in `budgets` keep only that
+        many minutes, and other days are capped at daily_study_hours.
+        """
+        free_time = FreeTimeIndex()
+        today = self.today()
+        local_dates = [today + timedelta(days=day) for day in range(days)]
+        
+        for day_date in local_dates:
             # Skip weekends if user prefers (could be extended based on preferences)
             if day_date.weekday() >= 5:  # 5=Saturday, 6=Sunday
                 continue
-                
-            # Get available time slots for this day
-            time_slots = self.get_available_time_slots(day_date)
             
-            for task, score in task_scores:
-                if task.estimated_duration <= 0:
-                    continue
-                    
-                # Try to schedule this task
-                remaining_duration = task.estimated_duration
-                
-                for slot in time_slots:
-                    if remaining_duration <= 0:
-                        break
-                        
-                    slot_duration = (slot['end'] - slot['start']).total_seconds() / 60
-                    
-                    if slot_duration <= 0:
-                        continue
-                    
-                    # Determine how much time we can use in this slot
-                    time_to_use = min(remaining_duration, slot_duration)
-                    
-                    # Create study session
-                    session_start = slot['start']
-                    session_end = session_start + timedelta(minutes=time_to_use)
-                    
-                    study_session = StudySession(
-                        user=self.user,
-                        task=task,
-                        course=task.course,
-                        title=f"Study: {task.title}",
-                        start_time=session_start,
-                        end_time=session_end,
-                        notes=f"Scheduled by AI planner for {task.title}"
-                    )
-                    study_session.save()
-                    study_sessions.append(study_session)
-                    
-                    # Update slot availability
-                    slot['start'] = session_end
-                    remaining_duration -= time_to_use
-                    
-                    # Update task estimated duration
-                    task.estimated_duration -= time_to_use
-                    if task.estimated_duration <= 0:
-                        task.estimated_duration = 0
-                    task.save()
+            for slot in self.get_available_time_slots(day_date):
+                free_time.add(slot['start'], slot['end'])
         
-        return study_sessions
+        for busy_start, busy_end in busy:
+            free_time.carve(busy_start, busy_end)
+        
+        budgets = budgets or {}
+        cap = self.profile.daily_study_hours * 60
+        for day_date in local_dates:
+            day_start, day_end = day_bounds(self.profile.timezone, day_date)
+            free_time.limit(day_start, day_end, budgets.get(day_date, cap))
+        
+        return free_time
+    
+    def today(self):
+        """The current date in the user's time zone"""
+        return local_date(self.now, self.profile.timezone)
+    
+    @staticmethod
+    def save_schedule(study_sessions, stale_ids):
+        """Apply the plan diffs of one or more users in a single transaction.
+        
+        Runs a fixed number of queries per SAVE_BATCH_SIZE sessions however
+        many were planned. Stale sessions the user completed or took over
+        since they were read are kept.
+        """
+        with calendar_changes(), transaction.atomic(), daily_load_changes():
+            for offset in range(0, len(stale_ids), SAVE_BATCH_SIZE):
+                StudySession.objects.filter(
+                    pk__in=stale_ids[offset:offset + SAVE_BATCH_SIZE],
+                    auto_scheduled=True,
+                    completed=False
+                ).delete()
+            if study_sessions:
+                StudySession.objects.bulk_create(study_sessions, batch_size=SAVE_BATCH_SIZE)
+                # bulk_create sends no signals
+                bump_calendar_version(*{session.user_id for session in study_sessions})
+                record_sessions_created(study_sessions)
     
     def get_available_time_slots(self, date):
-        """Get available time slots for studying on a given date"""
+        """Get available time slots for studying on a given local date"""
         slots = []
         
-        # Get user's preferred study hours
-        start_time = datetime.datetime.combine(
-            date, 
-            self.profile.preferred_study_hours_start
-        ).replace(tzinfo=timezone.utc)
-        
-        end_time = datetime.datetime.combine(
-            date, 
+        # Get user's preferred study hours, as instants in their time zone
+        start_time, end_time = local_window(
+            self.profile.timezone,
+            date,
+            self.profile.preferred_study_hours_start,
             self.profile.preferred_study_hours_end
-        ).replace(tzinfo=timezone.utc)
+        )
         
-        # Check if the date is today - if so, start from current time if later
-        if date.date() == self.now.date() and self.now > start_time:
+        # Start from the current time if the window has already begun
+        if self.now > start_time:
             start_time = self.now
         
         # Create time blocks based on session duration and breaks
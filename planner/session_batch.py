@@ -0,0 +1,216 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .calendar_feed import bump_calendar_version, calendar_changes
+from .conflicts import MAX_SESSION_LENGTH, SESSION_COLUMNS, find_conflicts, is_replaceable
+from .daily_load import daily_load_changes, record_session_change, record_sessions_created
+from .models import Course, StudySession, Task
+from .notifications import notify_dispatchers
+from .timezones import parse_client_time
+
+MAX_OPERATIONS = 500
+OPERATIONS = ('create', 'move', 'delete')
+
+
+class BatchError(Exception):
+    pass
+
+
+def _parse_time(value, name):
+    try:
+        return parse_client_time(value)
+    except (TypeError, ValueError):
+        raise BatchError(f"Invalid {name} time")
+
+
+def _parse_times(operation):
+    start = _parse_time(operation.get('start'), 'start')
+    end = _parse_time(operation.get('end'), 'end')
+    if end <= start:
+        raise BatchError("end must be after start")
+    if end - start > MAX_SESSION_LENGTH:
+        raise BatchError("Sessions can last at most 24 hours")
+    return start, end
+
+
+def _parse_id(operation, key):
+    value = operation.get(key)
+    if value is None:
+        return None
+    # Clients that build ids from form fields or URLs send numeric strings
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise BatchError(f"{key} must be an integer")
+
+
+def check_conflicts(user, candidates, exclude_ids):
+    """Mark the results of candidate sessions that would overlap a fixed session.
+
+    Planned sessions the planner may move are not conflicts; they are
+    re-planned around the batch afterwards.
+    """
+    if not candidates:
+        return
+    window_start = min(session.start_time for session, _ in candidates)
+    window_end = max(session.end_time for session, _ in candidates)
+    now = timezone.now()
+    existing = StudySession.objects.filter(
+        user=user,
+        start_time__gte=window_start - MAX_SESSION_LENGTH,
+        start_time__lt=window_end,
+        end_time__gt=window_start
+    ).exclude(pk__in=exclude_ids).values(*SESSION_COLUMNS)
+    sessions = [session for session in existing if not is_replaceable(session, now)]
+    by_key = {}
+    for session, result in candidates:
+        key = ('op', result['index'])
+        by_key[key] = result
+        sessions.append({'id': key, 'start_time': session.start_time, 'end_time': session.end_time})
+
+    for first, second, _, _ in find_conflicts(sessions):
+        for own, other in ((first, second), (second, first)):
+            result = by_key.get(own)
+            if result is None or result['status'] == 'error':
+                continue
+            result['status'] = 'error'
+            if other in by_key:
+                result['message'] = f"Overlaps operation {other[1]}"
+            else:
+                result['message'] = f"Overlaps session {other}"
+                result['conflicts'] = [other]
+
+
+def apply_session_operations(user, operations):
+    """Validate and apply a list of create/move/delete session operations.
+
+    Returns (ok, results, changed) with one result per operation, in order.
+    Sessions, tasks and courses referenced by the batch are checked for
+    ownership with one query each, and the resulting times against the
+    user's other sessions with one more. Nothing is written unless every
+    operation is valid; otherwise all are written together with bulk
+    queries. `changed` holds the created and moved sessions.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise BatchError("operations must be a non-empty list")
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f"At most {MAX_OPERATIONS} operations per batch")
+
+    session_ids = set()
+    task_ids = set()
+    course_ids = set()
+    for operation in operations:
+        if not isinstance(operation, dict):
+            continue
+        try:
+            if operation.get('op') in ('move', 'delete'):
+                session_ids.add(_parse_id(operation, 'id'))
+            elif operation.get('op') == 'create':
+                task_ids.add(_parse_id(operation, 'taskId'))
+                course_ids.add(_parse_id(operation, 'courseId'))
+        except BatchError:
+            pass
+    session_ids.discard(None)
+    task_ids.discard(None)
+    course_ids.discard(None)
+
+    sessions = StudySession.objects.filter(user=user, pk__in=session_ids).in_bulk() if session_ids else {}
+    owned_tasks = set(
+        Task.objects.filter(user=user, pk__in=task_ids).values_list('pk', flat=True)
+    ) if task_ids else set()
+    owned_courses = set(
+        Course.objects.filter(user=user, pk__in=course_ids).values_list('pk', flat=True)
+    ) if course_ids else set()
+
+    results = []
+    created = []
+    moved = {}
+    moved_results = {}
+    deleted = set()
+    for index, operation in enumerate(operations):
+        result = {'index': index}
+        try:
+            if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+                raise BatchError(f"op must be one of {', '.join(OPERATIONS)}")
+            op = result['op'] = operation['op']
+            if 'clientId' in operation:
+                result['clientId'] = operation['clientId']
+
+            if op == 'create':
+                start, end = _parse_times(operation)
+                task_id = _parse_id(operation, 'taskId')
+                course_id = _parse_id(operation, 'courseId')
+                if task_id is not None and task_id not in owned_tasks:
+                    raise BatchError("Task not found")
+                if course_id is not None and course_id not in owned_courses:
+                    raise BatchError("Course not found")
+                session = StudySession(
+                    user=user,
+                    title=str(operation.get('title') or 'Study Session')[:200],
+                    start_time=start,
+                    end_time=end,
+                    task_id=task_id,
+                    course_id=course_id,
+                )
+                created.append((session, result))
+            else:
+                session = sessions.get(_parse_id(operation, 'id'))
+                if session is None or session.pk in deleted:
+                    raise BatchError("Session not found")
+                result['sessionId'] = session.pk
+                if op == 'move':
+                    session.start_time, session.end_time = _parse_times(operation)
+                    # A session the user placed by hand is kept by later regenerations
+                    session.auto_scheduled = False
+                    moved[session.pk] = session
+                    moved_results[session.pk] = result
+                else:
+                    deleted.add(session.pk)
+                    moved.pop(session.pk, None)
+                    moved_results.pop(session.pk, None)
+        except BatchError as e:
+            result['status'] = 'error'
+            result['message'] = str(e)
+        else:
+            result['status'] = 'ok'
+        results.append(result)
+
+    if not any(result['status'] == 'error' for result in results):
+        check_conflicts(
+            user,
+            created + [(moved[pk], moved_results[pk]) for pk in moved],
+            deleted | set(moved)
+        )
+    if any(result['status'] == 'error' for result in results):
+        return False, results, []
+
+    new_sessions = [session for session, _ in created]
+    with calendar_changes(), transaction.atomic(), daily_load_changes():
+        if deleted:
+            # Sends post_delete, which updates DailyLoad and the calendar version
+            StudySession.objects.filter(pk__in=deleted).delete()
+        if moved:
+            StudySession.objects.bulk_update(
+                moved.values(), ['start_time', 'end_time', 'auto_scheduled']
+            )
+        if new_sessions:
+            StudySession.objects.bulk_create(new_sessions)
+            record_sessions_created(new_sessions)
+        # bulk_update and bulk_create send no signals
+        for session in moved.values():
+            new = session.load_contribution()
+            record_session_change(getattr(session, '_loaded_load', None), new)
+            session._loaded_load = new
+        if moved or new_sessions:
+            bump_calendar_version(user.pk)
+
+    for session, result in created:
+        result['sessionId'] = session.pk
+    changed = new_sessions + list(moved.values())
+    for session in changed:
+        notify_dispatchers(session)
+    return True, results, changed
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .calendar_feed import bump_calendar_version
+from .daily_load import rebuild_daily_loads, record_session_change
+from .models import Course, DeletedTask, StudySession, Task, UserProfile
+from .notifications import notify_dispatchers
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=StudySession)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=StudySession)
+def calendar_changed(sender, instance, **kwargs):
+    bump_calendar_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Task)
+def record_deleted_task(sender, instance, **kwargs):
+    DeletedTask.objects.create(task_id=instance.pk)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=StudySession)
+def reminder_changed(sender, instance, **kwargs):
+    notify_dispatchers(instance)
+
+
+@receiver(post_save, sender=StudySession)
+def session_saved(sender, instance, created, **kwargs):
+    old = None if created else getattr(instance, '_loaded_load', None)
+    new = instance.load_contribution()
+    if old != new:
+        record_session_change(old, new)
+    instance._loaded_load = new
+
+
+@receiver(post_delete, sender=StudySession)
+def session_deleted(sender, instance, **kwargs):
+    old = getattr(instance, '_loaded_load', None) or instance.load_contribution()
+    record_session_change(old, None)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_timezone', None)
+    if not created and loaded is not None and loaded != instance.timezone:
+        # Sessions now fall on different local days
+        rebuild_daily_loads(instance.user_id, instance.timezone)
+    instance._loaded_timezone = instance.timezone
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to new SQLite connections when SQLITE_TUNING is on"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_TUNING:
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
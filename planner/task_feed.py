@@ -0,0 +1,168 @@
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import DeletedTask, Task
+
+CHUNK_SIZE = 2000
+# How far ahead of now a task's due date must be for it to count as upcoming
+UPCOMING_WINDOW = timedelta(days=7)
+MAX_PAGE_SIZE = 10000
+
+# Sync cursors trail the clock so rows committed by transactions that were
+# still running when a poll was answered show up in the next poll
+SYNC_LAG = timedelta(seconds=5)
+# How long deletions are remembered; older sync cursors need a full sync
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+TASK_COLUMNS = ['id', 'title', 'due_date', 'priority', 'user__email', 'course__name']
+
+
+def encode_cursor(due_date, pk):
+    """Opaque keyset cursor for the position after (due_date, id)"""
+    return urlsafe_base64_encode(f'{due_date.isoformat()}|{pk}'.encode())
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        due_date, pk = urlsafe_base64_decode(cursor).decode().split('|')
+        due_date = parse_datetime(due_date)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if due_date is None:
+        raise ValueError("Invalid cursor")
+    return due_date, pk
+
+
+def upcoming_tasks(start_date, end_date, after=None):
+    """Open tasks of every user due in [start_date, end_date], in keyset order"""
+    tasks = Task.objects.filter(
+        due_date__range=[start_date, end_date],
+        status__in=['pending', 'in_progress']
+    )
+    if after:
+        due_date, pk = after
+        tasks = tasks.filter(Q(due_date__gt=due_date) | Q(due_date=due_date, id__gt=pk))
+    return tasks.order_by('due_date', 'id').values_list(*TASK_COLUMNS)
+
+
+async def aupcoming_tasks(start_date, end_date, after=None):
+    """Yield every row of upcoming_tasks, fetched CHUNK_SIZE rows at a time.
+
+    Each chunk is its own keyset query, so no cursor is held open between
+    them.
+    """
+    while True:
+        rows = [row async for row in upcoming_tasks(start_date, end_date, after)[:CHUNK_SIZE]]
+        for row in rows:
+            yield row
+        if len(rows) < CHUNK_SIZE:
+            return
+        after = (rows[-1][2], rows[-1][0])
+
+
+def serialize_row(row):
+    pk, title, due_date, priority, user_email, course = row
+    return {
+        'id': pk,
+        'title': title,
+        'due_date': due_date.isoformat(),
+        'priority': priority,
+        'user_email': user_email,
+        'course': course,
+    }
+
+
+def iter_ndjson(rows):
+    """One JSON object per line"""
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(serialize_row(row)) + '\n'
+
+
+def iter_json_array(rows):
+    """A JSON array, produced one element at a time"""
+    encoder = DjangoJSONEncoder()
+    yield '['
+    first = True
+    for row in rows:
+        if not first:
+            yield ','
+        first = False
+        yield encoder.encode(serialize_row(row))
+    yield ']'
+
+
+async def aiter_ndjson(rows):
+    """iter_ndjson over an async iterable of rows"""
+    encoder = DjangoJSONEncoder()
+    async for row in rows:
+        yield encoder.encode(serialize_row(row)) + '\n'
+
+
+async def aiter_json_array(rows):
+    """iter_json_array over an async iterable of rows"""
+    encoder = DjangoJSONEncoder()
+    yield '['
+    first = True
+    async for row in rows:
+        if not first:
+            yield ','
+        first = False
+        yield encoder.encode(serialize_row(row))
+    yield ']'
+
+
+def encode_sync_cursor(moment):
+    """Opaque delta sync cursor for changes after `moment`"""
+    return urlsafe_base64_encode((moment - SYNC_LAG).isoformat().encode())
+
+
+def decode_sync_cursor(cursor):
+    """Inverse of encode_sync_cursor; raises ValueError for malformed cursors"""
+    try:
+        moment = parse_datetime(urlsafe_base64_decode(cursor).decode())
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if moment is None:
+        raise ValueError("Invalid cursor")
+    return moment
+
+
+def changed_tasks(since, now):
+    """Tasks created or updated after `since`, whatever their status or due date.
+
+    Also includes untouched open tasks that entered the upcoming window as
+    it slid forward from `since` to `now`.
+    """
+    entered_window = Q(
+        due_date__gt=since + UPCOMING_WINDOW,
+        due_date__lte=now + UPCOMING_WINDOW,
+        status__in=['pending', 'in_progress'],
+    )
+    return Task.objects.filter(Q(updated_at__gt=since) | entered_window).order_by(
+        'updated_at', 'id'
+    ).values_list(*TASK_COLUMNS, 'status')
+
+
+def deleted_task_ids(since):
+    return list(
+        DeletedTask.objects.filter(deleted_at__gt=since)
+        .order_by('deleted_at').values_list('task_id', flat=True)
+    )
+
+
+def prune_tombstones(now):
+    DeletedTask.objects.filter(deleted_at__lt=now - TOMBSTONE_RETENTION).delete()
+
+
+def serialize_change(row):
+    change = serialize_row(row[:-1])
+    change['status'] = row[-1]
+    return change
+
@@ -0,0 +1,391 @@
+import csv
+import datetime
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .calendar_feed import bump_calendar_version, calendar_changes
+from .forms import TaskImportForm
+from .models import Course, StudySession, Task
+from .timezones import get_zone
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+# Errors beyond this many are counted but not reported row by row
+MAX_REPORTED_ERRORS = 100
+
+TASK_EXPORT_COLUMNS = [
+    'id', 'title', 'description', 'course', 'due_date', 'priority', 'estimated_duration', 'status',
+]
+SESSION_EXPORT_COLUMNS = [
+    'id', 'title', 'task_id', 'task', 'course', 'start_time', 'end_time', 'completed',
+    'auto_scheduled', 'notes',
+]
+
+PRIORITY_LABELS = {label.lower(): value for value, label in Task.PRIORITY_CHOICES}
+# iCalendar priorities run from 1 (highest) to 9 (lowest), 0 meaning undefined
+ICAL_PRIORITIES = {4: 1, 3: 3, 2: 5, 1: 9}
+ICAL_STATUSES = {'pending': 'NEEDS-ACTION', 'in_progress': 'IN-PROCESS', 'completed': 'COMPLETED'}
+STATUSES_FROM_ICAL = {value: key for key, value in ICAL_STATUSES.items()}
+DEFAULT_ESTIMATED_DURATION = 60
+
+ICAL_DURATION = re.compile(
+    r'^(?P<sign>[+-])?P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?'
+    r'(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$'
+)
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'errorCount': self.error_count, 'errors': self.errors}
+
+
+def decoded_lines(upload):
+    """Text lines of an uploaded file, read a chunk at a time"""
+    for line in upload:
+        yield line.decode('utf-8-sig')
+
+
+def csv_rows(lines):
+    """(line number, row) pairs from CSV text with a header row"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, {
+            (key or '').strip().lower(): (value or '').strip() for key, value in row.items()
+        }
+
+
+def unfold(lines):
+    """Join iCalendar content lines continued with leading whitespace"""
+    line_number = 0
+    current = None
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield line_number, current
+        line_number, current = number, line
+    if current is not None:
+        yield line_number, current
+
+
+def parse_content_line(line):
+    """Split 'NAME;PARAM=VALUE:value' into (NAME, {PARAM: VALUE}, value)"""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(
+        (key.upper(), param_value.strip('"'))
+        for key, _, param_value in (param.partition('=') for param in params)
+    ), value
+
+
+def unescape_text(value):
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def parse_ical_datetime(value, params):
+    """An aware datetime or, for floating times, a naive one in the user's zone"""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        # All-day deadlines are due at the end of the day
+        date = datetime.datetime.strptime(value[:8], '%Y%m%d').date()
+        return datetime.datetime.combine(date, datetime.time(23, 59))
+    moment = datetime.datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return moment.replace(tzinfo=datetime.timezone.utc)
+    if 'TZID' in params:
+        try:
+            return moment.replace(tzinfo=get_zone(params['TZID']))
+        except (KeyError, ValueError):
+            pass
+    return moment
+
+
+def parse_ical_duration(value):
+    match = ICAL_DURATION.match(value)
+    if not match:
+        raise ValueError(f"Invalid duration: {value}")
+    parts = {key: int(part or 0) for key, part in match.groupdict().items() if key != 'sign'}
+    return round(datetime.timedelta(
+        weeks=parts['weeks'], days=parts['days'], hours=parts['hours'],
+        minutes=parts['minutes'], seconds=parts['seconds']
+    ).total_seconds() / 60)
+
+
+def priority_from_ical(priority):
+    if 1 <= priority <= 2:
+        return 4
+    if 3 <= priority <= 4:
+        return 3
+    if priority >= 6:
+        return 1
+    return 2
+
+
+def ical_rows(lines):
+    """(line number, row) pairs for each VTODO, in the same shape as csv_rows"""
+    component = None
+    for line_number, line in unfold(lines):
+        name, params, value = parse_content_line(line)
+        if name == 'BEGIN' and value.upper() == 'VTODO':
+            component = {'line': line_number}
+        elif component is None:
+            continue
+        elif name == 'END' and value.upper() == 'VTODO':
+            yield component.pop('line'), component
+            component = None
+        else:
+            component[name] = (params, value)
+
+
+def ical_to_row(component):
+    """Map VTODO properties onto the import columns"""
+    row = {}
+    try:
+        for name, column in (('SUMMARY', 'title'), ('DESCRIPTION', 'description')):
+            if name in component:
+                row[column] = unescape_text(component[name][1])
+        if 'CATEGORIES' in component:
+            row['course'] = unescape_text(component['CATEGORIES'][1].split(',')[0])
+        if 'DUE' in component:
+            row['due_date'] = parse_ical_datetime(component['DUE'][1], component['DUE'][0])
+        if 'PRIORITY' in component:
+            row['priority'] = priority_from_ical(int(component['PRIORITY'][1]))
+        if 'STATUS' in component:
+            row['status'] = STATUSES_FROM_ICAL.get(component['STATUS'][1].upper(), '')
+        for name in ('X-ESTIMATED-DURATION', 'ESTIMATED-DURATION', 'DURATION'):
+            if name in component:
+                row['estimated_duration'] = parse_ical_duration(component[name][1])
+                break
+        else:
+            row['estimated_duration'] = DEFAULT_ESTIMATED_DURATION
+    except ValueError as e:
+        return None, str(e)
+    return row, None
+
+
+def course_map(user):
+    """Courses by lower-cased code, falling back to name"""
+    by_name = {}
+    by_code = {}
+    for course in Course.objects.filter(user=user):
+        by_name.setdefault(course.name.lower(), course)
+        if course.code:
+            by_code[course.code.lower()] = course
+    by_name.update(by_code)
+    return by_name
+
+
+def import_tasks(user, lines, file_format, zone_name='UTC'):
+    """Validate and insert the tasks in a CSV or iCalendar upload.
+
+    Rows are parsed as they are read, validated with TaskForm's rules and
+    inserted in batches, so memory stays flat however long the file is.
+    Invalid rows are skipped and reported; valid ones are all committed
+    together.
+    """
+    courses = course_map(user)
+    result = ImportResult()
+    batch = []
+
+    if file_format == 'ics':
+        rows = ((line, ical_to_row(component)) for line, component in ical_rows(lines))
+    else:
+        rows = ((line, (row, None)) for line, row in csv_rows(lines))
+
+    with timezone.override(get_zone(zone_name)), calendar_changes(), transaction.atomic():
+        for line, (row, error) in rows:
+            if error:
+                result.add_error(line, {'__all__': [error]})
+                continue
+            # Priorities may be given by label, and default like the model's
+            priority = str(row.get('priority') or Task._meta.get_field('priority').default)
+            row['priority'] = PRIORITY_LABELS.get(priority.strip().lower(), priority)
+            form = TaskImportForm(courses, data=row)
+            if not form.is_valid():
+                result.add_error(line, {field: list(errors) for field, errors in form.errors.items()})
+                continue
+
+            task = form.save(commit=False)
+            task.user = user
+            task.course = form.cleaned_data['course']
+            task.status = form.cleaned_data['status'] or 'pending'
+            batch.append(task)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                Task.objects.bulk_create(batch)
+                result.created += len(batch)
+                batch = []
+
+        if batch:
+            Task.objects.bulk_create(batch)
+            result.created += len(batch)
+        if result.created:
+            # bulk_create sends no signals
+            bump_calendar_version(user.pk)
+    return result
+
+
+class Echo:
+    """File-like object whose write() returns what it was given"""
+
+    def write(self, value):
+        return value
+
+
+def _isoformat(value):
+    return value.isoformat() if value else ''
+
+
+async def _achunked_rows(queryset, order_field, *columns):
+    """Yield values_list rows of `queryset` in (order_field, id) order.
+
+    `columns` must start with 'id'. Rows are fetched EXPORT_CHUNK_SIZE at a
+    time, each chunk with its own keyset query, so no cursor is held open
+    while the response is being sent.
+    """
+    after = None
+    while True:
+        chunk = queryset
+        if after:
+            value, pk = after
+            chunk = chunk.filter(
+                Q(**{f'{order_field}__gt': value}) | Q(**{order_field: value, 'id__gt': pk})
+            )
+        rows = [
+            row async for row in
+            chunk.order_by(order_field, 'id').values_list(order_field, *columns)[:EXPORT_CHUNK_SIZE]
+        ]
+        for row in rows:
+            yield row[1:]
+        if len(rows) < EXPORT_CHUNK_SIZE:
+            return
+        after = rows[-1][:2]
+
+
+def _task_rows(user):
+    return _achunked_rows(
+        Task.objects.filter(user=user), 'due_date',
+        'id', 'title', 'description', 'course__code', 'course__name', 'due_date', 'priority',
+        'estimated_duration', 'status'
+    )
+
+
+async def aiter_tasks_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(TASK_EXPORT_COLUMNS)
+    async for pk, title, description, code, name, due_date, priority, duration, status in _task_rows(user):
+        yield writer.writerow([
+            pk, title, description, code or name or '', _isoformat(due_date), priority, duration, status
+        ])
+
+
+async def aiter_sessions_csv(user):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SESSION_EXPORT_COLUMNS)
+    sessions = _achunked_rows(
+        StudySession.objects.filter(user=user), 'start_time',
+        'id', 'title', 'task_id', 'task__title', 'course__code', 'course__name', 'start_time',
+        'end_time', 'completed', 'auto_scheduled', 'notes'
+    )
+    async for row in sessions:
+        pk, title, task_id, task, code, name, start, end, completed, auto_scheduled, notes = row
+        yield writer.writerow([
+            pk, title, task_id or '', task or '', code or name or '', _isoformat(start),
+            _isoformat(end), completed, auto_scheduled, notes
+        ])
+
+
+def escape_text(value):
+    return (
+        value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Split a content line into 75-octet pieces as RFC 5545 requires"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode())
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def ical_datetime(value):
+    return value.astimezone(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+async def aiter_ics(user, include_tasks=True, include_sessions=True):
+    """Tasks as VTODOs and study sessions as VEVENTs in one calendar"""
+    stamp = ical_datetime(timezone.now())
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold('PRODID:-//AI Study Planner//Task export//EN')
+
+    if include_tasks:
+        async for row in _task_rows(user):
+            pk, title, description, code, name, due_date, priority, duration, status = row
+            lines = [
+                'BEGIN:VTODO',
+                f'UID:task-{pk}@study-planner',
+                f'DTSTAMP:{stamp}',
+                f'SUMMARY:{escape_text(title)}',
+                f'DUE:{ical_datetime(due_date)}',
+                f'PRIORITY:{ICAL_PRIORITIES.get(priority, 0)}',
+                f'STATUS:{ICAL_STATUSES.get(status, "NEEDS-ACTION")}',
+                f'X-ESTIMATED-DURATION:PT{duration}M',
+            ]
+            if description:
+                lines.append(f'DESCRIPTION:{escape_text(description)}')
+            if code or name:
+                lines.append(f'CATEGORIES:{escape_text(code or name)}')
+            lines.append('END:VTODO')
+            yield ''.join(fold(line) for line in lines)
+
+    if include_sessions:
+        sessions = _achunked_rows(
+            StudySession.objects.filter(user=user), 'start_time',
+            'id', 'title', 'task_id', 'course__code', 'course__name', 'start_time', 'end_time', 'notes'
+        )
+        async for row in sessions:
+            pk, title, task_id, code, name, start, end, notes = row
+            lines = [
+                'BEGIN:VEVENT',
+                f'UID:session-{pk}@study-planner',
+                f'DTSTAMP:{stamp}',
+                f'SUMMARY:{escape_text(title)}',
+                f'DTSTART:{ical_datetime(start)}',
+                f'DTEND:{ical_datetime(end)}',
+            ]
+            if task_id:
+                lines.append(f'RELATED-TO:task-{task_id}@study-planner')
+            if notes:
+                lines.append(f'DESCRIPTION:{escape_text(notes)}')
+            if code or name:
+                lines.append(f'CATEGORIES:{escape_text(code or name)}')
+            lines.append('END:VEVENT')
+            yield ''.join(fold(line) for line in lines)
+
+    yield fold('END:VCALENDAR')
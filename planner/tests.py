@@ -1,3 +1,1052 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+import random
+from importlib import import_module
+from io import StringIO
+import json
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db.models import F
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .conflicts import find_conflicts, overlapping_sessions
+from .dashboard import aload_dashboard
+from .free_time import FreeTimeIndex
+from .jobs import JOB_TIMEOUT, claim_next_job, enqueue_schedule_job
+from .models import Course, DailyLoad, ScheduleJob, StudySession, Task, UserProfile
+from .notifications import ReminderDispatcher
+from .scheduling_algorithm import (
+    STRATEGIES, PlannedTask, SchedulingEngine, StudyPlannerAlgorithm, TaskRow, WeightedPriority,
+    microseconds, rank_tasks_batch, score_task_rows,
+)
+from .session_batch import apply_session_operations
+from .task_feed import SYNC_LAG, decode_cursor, decode_sync_cursor, encode_cursor, encode_sync_cursor
+from .task_transfer import import_tasks
+from .timezones import day_bounds, local_date, local_window, parse_client_time
+
+T0 = datetime(2025, 3, 3, 9, 0, tzinfo=dt_timezone.utc)
+
+
+def at(hours):
+    return T0 + timedelta(hours=hours)
+
+
+class FreeTimeIndexTests(SimpleTestCase):
+    def index(self, *intervals):
+        free_time = FreeTimeIndex()
+        for start, end in intervals:
+            free_time.add(at(start), at(end))
+        return free_time
+
+    def intervals(self, free_time):
+        return [((start - T0) / timedelta(hours=1), (end - T0) / timedelta(hours=1))
+                for start, end in free_time]
+
+    def test_add_merges_overlapping_intervals(self):
+        free_time = self.index((0, 2), (4, 6), (1, 3), (5, 7))
+        self.assertEqual(self.intervals(free_time), [(0, 3), (4, 7)])
+
+    def test_add_ignores_empty_intervals(self):
+        free_time = self.index((2, 2), (3, 1))
+        self.assertEqual(len(free_time), 0)
+
+    def test_carve_splits_an_interval(self):
+        free_time = self.index((0, 8))
+        free_time.carve(at(2), at(3))
+        self.assertEqual(self.intervals(free_time), [(0, 2), (3, 8)])
+
+    def test_carve_trims_and_removes_across_intervals(self):
+        free_time = self.index((0, 2), (3, 4), (5, 8))
+        free_time.carve(at(1), at(6))
+        self.assertEqual(self.intervals(free_time), [(0, 1), (6, 8)])
+
+    def test_carve_at_boundaries_keeps_neighbours(self):
+        free_time = self.index((0, 2), (4, 6))
+        free_time.carve(at(2), at(4))
+        self.assertEqual(self.intervals(free_time), [(0, 2), (4, 6)])
+        free_time.carve(at(0), at(2))
+        self.assertEqual(self.intervals(free_time), [(4, 6)])
+
+    def test_carve_outside_or_empty_is_a_no_op(self):
+        free_time = self.index((2, 4))
+        free_time.carve(at(5), at(6))
+        free_time.carve(at(3), at(3))
+        self.assertEqual(self.intervals(free_time), [(2, 4)])
+
+    def test_limit_keeps_earliest_minutes_in_window(self):
+        free_time = self.index((0, 2), (3, 5), (10, 12))
+        free_time.limit(at(0), at(8), 150)
+        self.assertEqual(self.intervals(free_time), [(0, 2), (3, 3.5), (10, 12)])
+
+    def test_limit_on_exact_budget_drops_later_time(self):
+        free_time = self.index((0, 1), (2, 3))
+        free_time.limit(at(0), at(8), 60)
+        self.assertEqual(self.intervals(free_time), [(0, 1)])
+
+    def test_limit_with_no_budget_clears_window(self):
+        free_time = self.index((0, 2), (10, 12))
+        free_time.limit(at(0), at(8), 0)
+        self.assertEqual(self.intervals(free_time), [(10, 12)])
+
+    def test_limit_counts_only_time_inside_window(self):
+        free_time = self.index((0, 4))
+        free_time.limit(at(2), at(8), 60)
+        self.assertEqual(self.intervals(free_time), [(0, 3)])
+
+
+    def test_first_fit_finds_the_earliest_block_long_enough(self):
+        free_time = self.index((0, 0.5), (1, 3), (4, 8))
+        self.assertEqual(free_time.first_fit(60), at(1))
+        self.assertEqual(free_time.first_fit(120), at(1))
+        self.assertEqual(free_time.first_fit(180), at(4))
+        self.assertIsNone(free_time.first_fit(300))
+
+    def test_first_fit_respects_not_before_and_deadline(self):
+        free_time = self.index((0, 3), (4, 8))
+        self.assertEqual(free_time.first_fit(60, not_before=at(1.5)), at(1.5))
+        self.assertEqual(free_time.first_fit(120, not_before=at(1.5)), at(4))
+        self.assertEqual(free_time.first_fit(120, deadline=at(2)), at(0))
+        self.assertEqual(free_time.first_fit(180, deadline=at(7)), at(0))
+        self.assertIsNone(free_time.first_fit(120, not_before=at(2), deadline=at(5.5)))
+
+class TimezoneTests(SimpleTestCase):
+    # New York moved to daylight saving time at 02:00 on 9 March 2025
+    zone = 'America/New_York'
+
+    def test_local_window_follows_the_dst_change(self):
+        self.assertEqual(
+            local_window(self.zone, date(2025, 3, 7), time(9), time(21)),
+            (datetime(2025, 3, 7, 14, tzinfo=dt_timezone.utc), datetime(2025, 3, 8, 2, tzinfo=dt_timezone.utc)),
+        )
+        self.assertEqual(
+            local_window(self.zone, date(2025, 3, 10), time(9), time(21)),
+            (datetime(2025, 3, 10, 13, tzinfo=dt_timezone.utc), datetime(2025, 3, 11, 1, tzinfo=dt_timezone.utc)),
+        )
+
+    def test_local_window_on_the_dst_day_loses_the_skipped_hour(self):
+        start, end = local_window(self.zone, date(2025, 3, 9), time(1), time(4))
+        self.assertEqual(end - start, timedelta(hours=2))
+
+    def test_day_bounds_on_dst_days(self):
+        start, end = day_bounds(self.zone, date(2025, 3, 9))
+        self.assertEqual(start, datetime(2025, 3, 9, 5, tzinfo=dt_timezone.utc))
+        self.assertEqual(end - start, timedelta(hours=23))
+        start, end = day_bounds(self.zone, date(2025, 11, 2))
+        self.assertEqual(end - start, timedelta(hours=25))
+
+    def test_local_date(self):
+        moment = datetime(2025, 3, 10, 3, tzinfo=dt_timezone.utc)
+        self.assertEqual(local_date(moment, self.zone), date(2025, 3, 9))
+        self.assertEqual(local_date(moment, 'Asia/Tokyo'), date(2025, 3, 10))
+
+    def test_parse_client_time(self):
+        self.assertEqual(parse_client_time('2025-03-03T09:00:00+00:00'), T0)
+        with timezone.override(self.zone):
+            self.assertEqual(parse_client_time('2025-03-03T04:00'), T0)
+        for value in ('tomorrow', None):
+            with self.subTest(value=value):
+                with self.assertRaises((TypeError, ValueError)):
+                    parse_client_time(value)
+
+
+class SchedulingEngineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+
+    def task(self, hours_until_due, minutes, priority=2):
+        return Task.objects.create(
+            user=self.user, title=f'Due in {hours_until_due}h', due_date=at(hours_until_due),
+            estimated_duration=minutes, priority=priority,
+        )
+
+    def test_never_schedules_past_a_deadline(self):
+        tasks = [self.task(2, 240), self.task(5, 60, priority=4), self.task(30, 600, priority=1)]
+        free_time = [(at(0), at(1)), (at(1.5), at(6)), (at(24), at(40))]
+        for name in STRATEGIES:
+            with self.subTest(strategy=name):
+                chunks = SchedulingEngine(name).plan(tasks, free_time, T0)
+                for task, start, end in chunks:
+                    self.assertLess(start, end)
+                    self.assertLessEqual(end, task.due_date)
+
+    def test_chunks_are_never_empty(self):
+        # Float seconds once left remainders that became zero-length chunks
+        for seed in range(20):
+            rnd = random.Random(seed)
+            now = T0 + timedelta(seconds=rnd.randint(0, 3600), microseconds=rnd.randint(0, 999999))
+            tasks = [
+                Task(
+                    pk=index, title='Task', due_date=now + timedelta(seconds=rnd.uniform(3600, 30 * 86400)),
+                    estimated_duration=rnd.choice([25, 50, 90, 120]), priority=rnd.randint(1, 4),
+                )
+                for index in range(500)
+            ]
+            # 50 minute slots on the hour from 09:00 to 21:00 for 30 days
+            free_time = [
+                (max(now, day_start + timedelta(hours=hour)), day_start + timedelta(hours=hour, minutes=50))
+                for day_start in (T0.replace(hour=9) + timedelta(days=day) for day in range(30))
+                for hour in range(12)
+                if day_start + timedelta(hours=hour, minutes=50) > now
+            ]
+            for name in STRATEGIES:
+                with self.subTest(seed=seed, strategy=name):
+                    chunks = SchedulingEngine(name).plan(tasks, free_time, now)
+                    self.assertEqual([chunk for chunk in chunks if chunk[2] <= chunk[1]], [])
+
+    def test_regenerating_an_unchanged_plan_writes_nothing(self):
+        UserProfile.objects.filter(user=self.user).update(daily_study_hours=12, break_duration=10)
+        rnd = random.Random(7)
+        for _ in range(60):
+            self.task(rnd.uniform(1, 7 * 24), rnd.choice([25, 50, 90, 120]), priority=rnd.randint(1, 4))
+        for seed in range(10):
+            now = T0 + timedelta(seconds=rnd.randint(0, 3600), microseconds=rnd.randint(0, 999999))
+            for name in STRATEGIES:
+                with self.subTest(seed=seed, strategy=name):
+                    StudyPlannerAlgorithm(self.user, name, now=now).generate_schedule()
+                    before = set(StudySession.objects.values_list('pk', 'start_time', 'end_time'))
+
+                    StudyPlannerAlgorithm(self.user, name, now=now).generate_schedule()
+
+                    self.assertEqual(set(StudySession.objects.values_list('pk', 'start_time', 'end_time')), before)
+                    self.assertFalse(StudySession.objects.filter(start_time__gte=F('end_time')).exists())
+
+    def test_weighted_strategy_matches_calculate_task_score(self):
+        planner = StudyPlannerAlgorithm(self.user, now=T0)
+        strategy = WeightedPriority()
+        for hours, priority in [(0.5, 1), (1, 4), (14, 1), (96, 4), (500, 3)]:
+            task = self.task(hours, 60, priority=priority)
+            planned = PlannedTask(task, microseconds(task.due_date - T0), 3600 * 10 ** 6, task.priority)
+            self.assertAlmostEqual(strategy.key(planned, 0), -planner.calculate_task_score(task))
+
+    def test_batch_scores_match_calculate_task_score(self):
+        planner = StudyPlannerAlgorithm(self.user, now=T0)
+        tasks = [
+            self.task(hours, 60, priority=priority)
+            for hours, priority in [(0.5, 1), (1, 4), (14, 1), (96, 4), (500, 3)]
+        ]
+        scores = score_task_rows([(task.due_date, task.priority) for task in tasks], T0)
+        self.assertEqual(scores.tolist(), [planner.calculate_task_score(task) for task in tasks])
+
+    def test_batch_ranking_matches_strategy_keys(self):
+        self.task(30, 60, priority=1)
+        self.task(30, 240, priority=3)
+        self.task(8, 30, priority=2)
+        self.task(96, 600, priority=4)
+        self.task(8, 30, priority=2)
+        tasks = TaskRow.fetch(Task.objects.order_by('due_date'))
+        remaining = {task.pk: task.estimated_duration - 15 for task in tasks}
+        for name, strategy in STRATEGIES.items():
+            with self.subTest(strategy=name):
+                expected = sorted(
+                    (strategy().key(PlannedTask(
+                        task, microseconds(task.due_date - T0), remaining[task.pk] * 60 * 10 ** 6, task.priority
+                    ), 0), seq, task.pk)
+                    for seq, task in enumerate(tasks)
+                )
+                ids, keys = rank_tasks_batch(tasks, T0, name, remaining)
+                self.assertEqual(ids.tolist(), [pk for _, _, pk in expected])
+                self.assertEqual(keys.tolist(), [key for key, _, _ in expected])
+
+    def test_default_strategy_does_not_starve_a_task_due_soon(self):
+        # Profile defaults: 09:00-21:00 UTC and 4 hours a day, starting at 09:00
+        urgent = self.task(14, 120, priority=1)
+        for _ in range(3):
+            self.task(96, 240, priority=4)
+
+        sessions = StudyPlannerAlgorithm(self.user, now=T0).generate_schedule()
+
+        urgent_minutes = sum(
+            (session.end_time - session.start_time) / timedelta(minutes=1)
+            for session in sessions
+            if session.task_id == urgent.pk and session.end_time <= urgent.due_date
+        )
+        self.assertEqual(urgent_minutes, 120)
+
+
+class PlanAllTests(TestCase):
+    def test_plans_every_user_like_generate_schedule(self):
+        users = [User.objects.create_user(f'student{index}') for index in range(3)]
+        for index, user in enumerate(users):
+            UserProfile.objects.create(user=user)
+            for hours, minutes, priority in [(14, 120, 1), (50, 300, 3), (96, 240, 4)]:
+                Task.objects.create(
+                    user=user, title='Task', due_date=at(hours + index), estimated_duration=minutes,
+                    priority=priority,
+                )
+
+        with mock.patch('planner.management.commands.plan_all.timezone.now', return_value=T0):
+            call_command('plan_all', workers=1, chunk_size=2, stdout=StringIO())
+
+        for user in users:
+            with self.subTest(user=user.username):
+                planned = list(StudySession.objects.filter(user=user).values_list('task_id', 'start_time', 'end_time'))
+                self.assertTrue(planned)
+                expected = StudyPlannerAlgorithm(user, now=T0).generate_schedule()
+                self.assertCountEqual(
+                    planned, [(session.task_id, session.start_time, session.end_time) for session in expected]
+                )
+
+    def test_keeps_sessions_completed_while_planning(self):
+        user = User.objects.create_user('student')
+        UserProfile.objects.create(user=user)
+        Task.objects.create(user=user, title='Task', due_date=at(48), estimated_duration=180)
+        StudyPlannerAlgorithm(user, now=T0).generate_schedule()
+        # Moved out of the way, so the next plan replaces them
+        StudySession.objects.update(start_time=F('start_time') + timedelta(days=1),
+                                    end_time=F('end_time') + timedelta(days=1))
+        stale = set(StudySession.objects.values_list('pk', flat=True))
+        diff_plan = StudyPlannerAlgorithm.diff_plan
+
+        def complete_meanwhile(planner, chunks, released):
+            StudySession.objects.filter(pk__in=stale).update(completed=True)
+            return diff_plan(planner, chunks, released)
+
+        with mock.patch('planner.management.commands.plan_all.timezone.now', return_value=T0), \
+                mock.patch.object(StudyPlannerAlgorithm, 'diff_plan', complete_meanwhile):
+            call_command('plan_all', workers=1, stdout=StringIO())
+
+        self.assertEqual(set(StudySession.objects.filter(completed=True).values_list('pk', flat=True)), stale)
+
+class RescheduleTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', password='secret')
+        # Three 55 minute slots a day, from 09:00 UTC
+        UserProfile.objects.create(
+            user=self.user, preferred_study_hours_start=time(9), preferred_study_hours_end=time(12),
+            study_session_duration=55, break_duration=5, daily_study_hours=3,
+        )
+        self.planner = StudyPlannerAlgorithm(self.user, now=T0)
+
+    def task(self, hours_until_due, minutes, priority=2):
+        return Task.objects.create(
+            user=self.user, title=f'Due in {hours_until_due}h', due_date=at(hours_until_due),
+            estimated_duration=minutes, priority=priority,
+        )
+
+    def test_save_schedule_keeps_sessions_taken_over_since_planning(self):
+        self.task(48, 180)
+        planned = self.planner.generate_schedule()
+        completed, edited, stale = planned[:3]
+        StudySession.objects.filter(pk=completed.pk).update(completed=True)
+        StudySession.objects.filter(pk=edited.pk).update(auto_scheduled=False)
+
+        self.planner.save_schedule([], [completed.pk, edited.pk, stale.pk])
+
+        self.assertCountEqual(
+            StudySession.objects.filter(pk__in=[completed.pk, edited.pk, stale.pk]),
+            [completed, edited]
+        )
+
+    def sessions(self, task):
+        return set(StudySession.objects.filter(task=task).values_list('pk', 'start_time', 'end_time'))
+
+    def planned_minutes(self, task):
+        return sum((end - start) / timedelta(minutes=1) for _, start, end in self.sessions(task))
+
+    def test_query_count_does_not_grow_with_the_plan(self):
+        counts = []
+        for count in (2, 20):
+            user = User.objects.create_user(f'student{count}')
+            # 26 slots left today, so every task is planned today
+            UserProfile.objects.create(
+                user=user, preferred_study_hours_start=time(8), preferred_study_hours_end=time(20),
+                study_session_duration=20, break_duration=5, daily_study_hours=12,
+            )
+            for _ in range(count):
+                Task.objects.create(user=user, title='Task', due_date=at(10), estimated_duration=20)
+            planner = StudyPlannerAlgorithm(user, now=T0)
+            with CaptureQueriesContext(connection) as queries:
+                planned = planner.generate_schedule()
+            self.assertEqual(len(planned), count)
+
+            stale_ids = [session.pk for session in planned]
+            sessions = [
+                StudySession(user=user, title='Session', start_time=at(index / 60), end_time=at((index + 1) / 60),
+                             auto_scheduled=True)
+                for index in range(3 * count)
+            ]
+            with CaptureQueriesContext(connection) as saved:
+                StudyPlannerAlgorithm.save_schedule(sessions, stale_ids)
+            self.assertEqual(StudySession.objects.filter(user=user).count(), 3 * count)
+            counts.append((len(queries), len(saved)))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_diff_plan_reuses_unchanged_sessions(self):
+        task = self.task(48, 165)
+        kept, moved, _ = planned = self.planner.generate_schedule()
+        chunks = [(task, kept.start_time, kept.end_time), (task, at(30), at(31))]
+
+        study_sessions, new_sessions, stale_ids = self.planner.diff_plan(chunks, planned)
+
+        self.assertEqual(study_sessions[0], kept)
+        self.assertEqual([(session.start_time, session.end_time) for session in new_sessions], [(at(30), at(31))])
+        self.assertCountEqual(stale_ids, [moved.pk, planned[2].pk])
+
+    def test_reschedule_keeps_the_sessions_of_other_tasks(self):
+        edited, other = self.task(100, 110), self.task(100, 110)
+        self.planner.generate_schedule()
+        before = self.sessions(other)
+        Task.objects.filter(pk=edited.pk).update(estimated_duration=165)
+
+        self.planner.reschedule([edited.pk])
+
+        self.assertEqual(self.sessions(other), before)
+        self.assertEqual(self.planned_minutes(edited), 165)
+
+    def test_reschedule_displaces_lower_ranked_sessions_when_short(self):
+        urgent, later = self.task(27, 110), self.task(100, 165)
+        self.planner.generate_schedule()
+        self.assertTrue(any(start < urgent.due_date for _, start, _ in self.sessions(later)))
+        # Only all six slots before its deadline fit it now
+        Task.objects.filter(pk=urgent.pk).update(estimated_duration=330)
+
+        self.planner.reschedule([urgent.pk])
+
+        self.assertEqual(self.planned_minutes(urgent), 330)
+        self.assertTrue(all(end <= urgent.due_date for _, _, end in self.sessions(urgent)))
+        self.assertEqual(self.planned_minutes(later), 165)
+        self.assertTrue(all(start >= urgent.due_date for _, start, _ in self.sessions(later)))
+
+    def test_rescheduling_an_unchanged_task_writes_nothing(self):
+        task, other = self.task(27, 110), self.task(100, 165)
+        self.planner.generate_schedule()
+        before = self.sessions(task) | self.sessions(other)
+
+        self.planner.reschedule([task.pk])
+
+        self.assertEqual(self.sessions(task) | self.sessions(other), before)
+
+    def test_reschedule_around_sessions_moves_only_what_overlaps(self):
+        first, second = self.task(100, 165), self.task(100, 165)
+        self.planner.generate_schedule()
+        before = {task.pk: self.sessions(task) for task in (first, second)}
+        blocked = StudySession.objects.filter(task=first).earliest('start_time')
+        manual = StudySession.objects.create(
+            user=self.user, title='Manual', start_time=blocked.start_time, end_time=blocked.end_time
+        )
+
+        self.planner.reschedule_around_sessions([manual])
+
+        self.assertFalse(StudySession.objects.filter(pk=blocked.pk).exists())
+        self.assertEqual(self.sessions(second), before[second.pk])
+        self.assertEqual(len(self.sessions(first) & before[first.pk]), 2)
+        self.assertEqual(self.planned_minutes(first), 165)
+        running = StudySession.objects.filter(user=self.user).values('id', 'start_time', 'end_time')
+        self.assertEqual(find_conflicts(running), [])
+
+    def test_editing_a_task_replans_it(self):
+        edited, other = self.task(100, 110), self.task(100, 110)
+        self.client.login(username='student', password='secret')
+        with mock.patch('django.utils.timezone.now', return_value=T0):
+            self.planner.generate_schedule()
+            before = self.sessions(other)
+            response = self.client.post(f'/tasks/{edited.pk}/edit/', {
+                'title': edited.title, 'description': '', 'course': '', 'priority': edited.priority,
+                'due_date': edited.due_date.strftime('%Y-%m-%dT%H:%M'), 'estimated_duration': 165,
+            })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.planned_minutes(edited), 165)
+        self.assertEqual(self.sessions(other), before)
+
+    def test_moving_a_session_replans_what_it_lands_on(self):
+        moved_task, other = self.task(100, 110), self.task(100, 110)
+        self.client.login(username='student', password='secret')
+        with mock.patch('django.utils.timezone.now', return_value=T0):
+            self.planner.generate_schedule()
+            moved = StudySession.objects.filter(task=moved_task).earliest('start_time')
+            target = StudySession.objects.filter(task=other).earliest('start_time')
+            response = self.client.put('/api/study-sessions/', {
+                'id': moved.pk, 'start': target.start_time.isoformat(), 'end': target.end_time.isoformat(),
+            }, content_type='application/json')
+
+        self.assertEqual(response.json(), {'status': 'success'})
+        self.assertFalse(StudySession.objects.filter(pk=target.pk).exists())
+        self.assertEqual(self.planned_minutes(other), 110)
+        running = StudySession.objects.filter(user=self.user).values('id', 'start_time', 'end_time')
+        self.assertEqual(find_conflicts(running), [])
+
+
+class ListSink:
+    def __init__(self):
+        self.reminders = []
+
+    def send(self, reminder):
+        self.reminders.append(reminder)
+
+
+class ReminderDispatcherTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student', email='student@example.com')
+        self.now = T0
+        clock = mock.patch('planner.notifications.timezone.now', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+        self.sink = ListSink()
+
+    def dispatcher(self, **kwargs):
+        dispatcher = ReminderDispatcher(self.sink, **kwargs)
+        self.addCleanup(dispatcher.stop)
+        return dispatcher
+
+    def task(self, due, **kwargs):
+        return Task.objects.create(user=self.user, title='Task', due_date=due, estimated_duration=30, **kwargs)
+
+    def session(self, start, **kwargs):
+        return StudySession.objects.create(
+            user=self.user, title='Session', start_time=start, end_time=start + timedelta(hours=1), **kwargs
+        )
+
+    def sent(self):
+        return [(reminder['kind'], reminder['id']) for reminder in self.sink.reminders]
+
+    def test_refresh_loads_reminders_within_the_horizon(self):
+        soon, later = self.task(at(24.5)), self.task(at(26))
+        self.task(at(24.5), status='completed')
+        starting, _ = self.session(at(1)), self.session(at(2))
+        self.now = at(-48)
+        dispatcher = self.dispatcher()
+        self.now = T0
+
+        dispatcher.refresh(T0)
+
+        self.assertEqual(dispatcher.queued, {('task', soon.pk, at(24.5)), ('session', starting.pk, at(1))})
+        self.assertEqual(self.sent(), [])
+
+    def test_fires_each_reminder_once_when_due(self):
+        task, session = self.task(at(24.5)), self.session(at(1))
+        dispatcher = self.dispatcher()
+
+        self.now = at(0.25)
+        dispatcher.run_pending()
+        self.assertEqual(self.sent(), [])
+        self.now = at(0.5)
+        dispatcher.run_pending()
+        self.assertEqual(self.sent(), [('task', task.pk)])
+        self.now = at(0.75)
+        dispatcher.run_pending()
+        self.now = at(0.8)
+        dispatcher.run_pending()
+        self.assertEqual(self.sent(), [('task', task.pk), ('session', session.pk)])
+        self.assertEqual(self.sink.reminders[0]['email'], 'student@example.com')
+
+    def test_skips_reminders_that_were_due_before_it_started(self):
+        self.now = at(-1)
+        self.task(at(23.5))
+        self.session(at(0.1))
+        upcoming = self.task(at(24.25))
+        self.now = T0
+        dispatcher = self.dispatcher()
+
+        dispatcher.run_pending()
+        self.now = at(0.25)
+        dispatcher.run_pending()
+
+        self.assertEqual(self.sent(), [('task', upcoming.pk)])
+
+    def test_rechecks_before_sending(self):
+        completed, moved = self.task(at(24.5)), self.task(at(24.5))
+        session = self.session(at(0.5))
+        dispatcher = self.dispatcher(refresh_interval=timedelta(hours=2))
+        dispatcher.run_pending()
+        # Updates send no signals, so the queued reminders are now stale
+        Task.objects.filter(pk=completed.pk).update(status='completed')
+        Task.objects.filter(pk=moved.pk).update(due_date=at(48))
+        StudySession.objects.filter(pk=session.pk).delete()
+
+        self.now = at(0.5)
+        dispatcher.run_pending()
+
+        self.assertEqual(self.sent(), [])
+
+    def test_saving_wakes_it_with_the_new_reminder(self):
+        dispatcher = self.dispatcher(refresh_interval=timedelta(hours=2))
+        dispatcher.run_pending()
+        dispatcher.wakeup.clear()
+
+        task = self.task(at(24.5))
+
+        self.assertTrue(dispatcher.wakeup.is_set())
+        self.assertEqual(dispatcher.seconds_until_next(), 30 * 60)
+        self.now = at(0.5)
+        dispatcher.run_pending()
+        self.assertEqual(self.sent(), [('task', task.pk)])
+
+
+class ScheduleJobTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+
+    def running_job(self, started_ago):
+        return ScheduleJob.objects.create(
+            user=self.user, status='running', started_at=timezone.now() - started_ago
+        )
+
+    def test_claim_fails_jobs_whose_worker_died(self):
+        stale = self.running_job(JOB_TIMEOUT + timedelta(minutes=1))
+        active = self.running_job(timedelta(minutes=1))
+        pending = enqueue_schedule_job(self.user)
+
+        self.assertEqual(claim_next_job(), pending)
+        stale.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertIsNotNone(stale.finished_at)
+        self.assertEqual(active.status, 'running')
+
+    def test_status_api_reports_a_dead_job_as_failed(self):
+        stale = self.running_job(JOB_TIMEOUT + timedelta(minutes=1))
+        self.client.force_login(self.user)
+        response = self.client.get(f'/api/schedule-jobs/{stale.pk}/')
+        self.assertEqual(response.json()['status'], 'failed')
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user, timezone='Pacific/Auckland')
+
+    def session(self, start):
+        return StudySession.objects.create(
+            user=self.user, title='Session', start_time=start, end_time=start + timedelta(hours=1)
+        )
+
+    async def test_today_is_the_users_local_day(self):
+        # 20:00 UTC on 3 March is 09:00 on 4 March in Auckland (UTC+13)
+        now = datetime(2025, 3, 3, 20, tzinfo=dt_timezone.utc)
+        await sync_to_async(self.session)(datetime(2025, 3, 3, 9, tzinfo=dt_timezone.utc))
+        today = await sync_to_async(self.session)(datetime(2025, 3, 4, 2, tzinfo=dt_timezone.utc))
+        await sync_to_async(self.session)(datetime(2025, 3, 4, 11, tzinfo=dt_timezone.utc))
+
+        with mock.patch('planner.dashboard.timezone.now', return_value=now):
+            data = await aload_dashboard(self.user)
+
+        self.assertEqual(data['today_sessions'], [today])
+
+
+class CalendarEventsTests(TestCase):
+    def setUp(self):
+        caches['calendar'].clear()
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.course = Course.objects.create(user=self.user, name='Maths')
+        self.session = StudySession.objects.create(
+            user=self.user, course=self.course, title='Algebra', start_time=at(1), end_time=at(2)
+        )
+
+    def events(self, **headers):
+        return self.client.get(
+            '/calendar/events/', {'start': at(-24).isoformat(), 'end': at(24).isoformat()}, headers=headers
+        )
+
+    def test_unchanged_feed_is_not_modified(self):
+        response = self.events()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'])
+
+        with self.assertNumQueries(3):
+            # The login session, the user and the calendar version
+            not_modified = self.events(if_none_match=response['ETag'])
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+        self.assertEqual(not_modified.content, b'')
+
+    def test_changes_to_every_model_change_the_etag(self):
+        changes = {
+            'task created': lambda: Task.objects.create(
+                user=self.user, title='Essay', due_date=at(10), estimated_duration=30
+            ),
+            'task saved': lambda: Task.objects.get(user=self.user).save(),
+            'task deleted': lambda: Task.objects.get(user=self.user).delete(),
+            'course saved': lambda: Course.objects.get(pk=self.course.pk).save(),
+            'session saved': lambda: StudySession.objects.get(pk=self.session.pk).save(),
+            'session deleted': lambda: StudySession.objects.get(pk=self.session.pk).delete(),
+            'course deleted': lambda: Course.objects.get(pk=self.course.pk).delete(),
+        }
+        for change, apply in changes.items():
+            with self.subTest(change=change):
+                etag = self.events()['ETag']
+                apply()
+                response = self.events(if_none_match=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_responses_are_cached_per_version(self):
+        first = self.events()
+        # Updates send no signals, so the version and cached feed stay
+        StudySession.objects.filter(pk=self.session.pk).update(title='Renamed')
+
+        # No event queries
+        with self.assertNumQueries(3):
+            cached = self.events()
+        self.assertEqual(cached.content, first.content)
+
+        StudySession.objects.get(pk=self.session.pk).save()
+        self.assertEqual(self.events().json()[0]['title'], 'Renamed')
+        self.assertEqual(self.events(if_none_match=first['ETag']).status_code, 200)
+
+
+class TaskFeedTests(TestCase):
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(T0, 42)), (T0, 42))
+        self.assertEqual(decode_sync_cursor(encode_sync_cursor(T0)), T0 - SYNC_LAG)
+
+    def test_malformed_cursors_are_rejected(self):
+        # The last is 'tomorrow|1' encoded
+        for cursor in ['', 'not base64!', encode_cursor(T0, 1)[:-3], 'dG9tb3Jyb3d8MQ']:
+            for decode in (decode_cursor, decode_sync_cursor):
+                with self.subTest(cursor=cursor, decode=decode.__name__):
+                    with self.assertRaises(ValueError):
+                        decode(cursor)
+
+    def test_pages_follow_the_next_cursor(self):
+        user = User.objects.create_user('student', email='student@example.com')
+        due = timezone.now() + timedelta(days=1)
+        # Equal due dates make the cursor tell rows apart by id
+        tasks = [
+            Task.objects.create(user=user, title=f'Task {index}', due_date=due + timedelta(hours=index // 2),
+                                estimated_duration=30)
+            for index in range(5)
+        ]
+        seen = []
+        after = ''
+        while True:
+            response = self.client.get(
+                f'/api/upcoming-tasks/?limit=2&after={after}', HTTP_AUTHORIZATION='Token test'
+            )
+            seen.extend(task['id'] for task in response.json())
+            after = response.get('X-Next-Cursor')
+            if not after:
+                break
+        self.assertEqual(seen, [task.pk for task in tasks])
+
+    @mock.patch('planner.task_feed.CHUNK_SIZE', 2)
+    async def test_streams_every_task_across_chunks(self):
+        user = await User.objects.acreate(username='student', email='student@example.com')
+        due = timezone.now() + timedelta(days=1)
+        # Due dates repeat, so chunks also split rows with equal sort keys
+        await Task.objects.abulk_create(
+            Task(user=user, title=f'Task {index}', due_date=due + timedelta(hours=index % 2), estimated_duration=30)
+            for index in range(5)
+        )
+        expected = [pk async for pk in Task.objects.order_by('due_date', 'id').values_list('id', flat=True)]
+
+        for headers, query in [({'accept': 'application/x-ndjson'}, ''), ({}, '?format=ndjson'), ({}, '')]:
+            with self.subTest(headers=headers, query=query):
+                response = await self.async_client.get(
+                    f'/api/upcoming-tasks/{query}', headers={'authorization': 'Token test', **headers}
+                )
+                content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+                if response['Content-Type'] == 'application/x-ndjson':
+                    tasks = [json.loads(line) for line in content.splitlines()]
+                else:
+                    tasks = json.loads(content)
+                self.assertEqual([task['id'] for task in tasks], expected)
+                self.assertEqual(tasks[0]['user_email'], 'student@example.com')
+
+    def test_rejects_out_of_range_limits(self):
+        for limit in ('0', '-1', '10001', 'ten'):
+            with self.subTest(limit=limit):
+                response = self.client.get(f'/api/upcoming-tasks/?limit={limit}', HTTP_AUTHORIZATION='Token test')
+                self.assertEqual(response.status_code, 400)
+
+    def test_delta_includes_tasks_that_entered_the_window(self):
+        user = User.objects.create_user('student', email='student@example.com')
+        # Nothing below is touched after the first poll
+        synced = timezone.now() + timedelta(hours=1)
+        polled = synced + timedelta(days=2)
+
+        def task(title, due, status='pending'):
+            return Task.objects.create(user=user, title=title, due_date=due, status=status,
+                                       estimated_duration=30)
+
+        task('Already upcoming', synced + timedelta(days=3))
+        entered = task('Entered', synced + timedelta(days=8))
+        task('Completed', synced + timedelta(days=8), status='completed')
+        task('Still too far', synced + timedelta(days=10))
+
+        with mock.patch('planner.views.timezone.now', return_value=synced):
+            cursor = self.client.get(
+                '/api/upcoming-tasks/', HTTP_AUTHORIZATION='Token test'
+            )['X-Sync-Cursor']
+        with mock.patch('planner.views.timezone.now', return_value=polled):
+            response = self.client.get(
+                f'/api/upcoming-tasks/?since={cursor}', HTTP_AUTHORIZATION='Token test'
+            )
+
+        self.assertEqual([change['id'] for change in response.json()['tasks']], [entered.pk])
+
+
+class TaskImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def test_imports_valid_rows_and_reports_invalid_ones(self):
+        course = Course.objects.create(user=self.user, name='Algebra', code='MATH101')
+        lines = [
+            'title,course,due_date,priority,estimated_duration,status\n',
+            'Problem set,math101,2025-03-10 17:00,High,90,in_progress\n',
+            'No such course,BIO200,2025-03-12 09:00,2,60,\n',
+            'Reading,,2025-03-11 09:00,,30,\n',
+            ',MATH101,2025-03-12 09:00,2,60,\n',
+        ]
+
+        result = import_tasks(self.user, lines, 'csv')
+
+        self.assertEqual(result.created, 2)
+        self.assertEqual([error['line'] for error in result.errors], [3, 5])
+        self.assertIn('course', result.errors[0]['errors'])
+        self.assertEqual(list(result.errors[1]['errors']), ['title'])
+        first, second = Task.objects.filter(user=self.user).order_by('due_date')
+        self.assertEqual((first.course, first.priority, first.status), (course, 3, 'in_progress'))
+        self.assertEqual((second.course, second.priority, second.status), (None, 2, 'pending'))
+
+    def test_get_is_not_allowed(self):
+        response = self.client.get('/tasks/import/')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'POST')
+
+    def test_missing_file_redirects_to_the_task_list(self):
+        response = self.client.post('/tasks/import/')
+        self.assertRedirects(response, '/tasks/', fetch_redirect_response=False)
+
+
+class TaskExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+
+    async def export(self, query):
+        response = await self.async_client.get(f'/tasks/export/?{query}')
+        return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+    @mock.patch('planner.task_transfer.EXPORT_CHUNK_SIZE', 2)
+    async def test_exports_stream_every_row_across_chunks(self):
+        # Due dates repeat, so chunks also split rows with equal sort keys
+        await Task.objects.abulk_create(
+            Task(user=self.user, title=f'Task {index}', due_date=at(index % 3), estimated_duration=30)
+            for index in range(5)
+        )
+        await StudySession.objects.abulk_create(
+            StudySession(user=self.user, title=f'Session {index}', start_time=at(index), end_time=at(index + 1))
+            for index in range(3)
+        )
+        await self.async_client.aforce_login(self.user)
+        titles = [title async for title in Task.objects.order_by('due_date', 'id').values_list('title', flat=True)]
+
+        lines = (await self.export('kind=tasks')).splitlines()
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], titles)
+        self.assertEqual(len((await self.export('kind=sessions')).splitlines()), 4)
+        self.assertEqual((await self.export('format=ics&kind=all')).count('UID:'), 8)
+
+
+class ConflictTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+
+    def test_find_conflicts_reports_every_overlapping_pair(self):
+        sessions = [
+            {'id': 'a', 'start_time': at(0), 'end_time': at(3)},
+            {'id': 'b', 'start_time': at(1), 'end_time': at(2)},
+            {'id': 'c', 'start_time': at(1.5), 'end_time': at(4)},
+            {'id': 'd', 'start_time': at(4), 'end_time': at(5)},
+        ]
+        self.assertCountEqual(find_conflicts(reversed(sessions)), [
+            ('a', 'b', at(1), at(2)),
+            ('a', 'c', at(1.5), at(3)),
+            ('b', 'c', at(1.5), at(2)),
+        ])
+
+    def test_overlapping_sessions_looks_past_a_legacy_overlap(self):
+        # Overlaps from before the checks existed: A covers B
+        first = StudySession.objects.create(user=self.user, title='A', start_time=at(0), end_time=at(3))
+        StudySession.objects.create(user=self.user, title='B', start_time=at(1), end_time=at(2))
+        later = StudySession.objects.create(user=self.user, title='C', start_time=at(3.5), end_time=at(4))
+
+        found = overlapping_sessions(self.user, at(2.5), at(3.75))
+
+        self.assertEqual([session['id'] for session in found], [first.pk, later.pk])
+
+
+class SessionBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+        self.session = StudySession.objects.create(
+            user=self.user, title='Reading', start_time=at(0), end_time=at(1)
+        )
+        self.task = Task.objects.create(
+            user=self.user, title='Essay', due_date=at(48), estimated_duration=60
+        )
+
+    def operations(self, delete_id):
+        return [
+            {'op': 'create', 'start': at(2).isoformat(), 'end': at(3).isoformat(),
+             'taskId': str(self.task.pk)},
+            {'op': 'move', 'id': str(self.session.pk), 'start': at(4).isoformat(), 'end': at(5).isoformat()},
+            {'op': 'delete', 'id': delete_id},
+        ]
+
+    def test_one_invalid_operation_applies_none(self):
+        for delete_id in ('abc', 1.5, True, str(self.session.pk + 100)):
+            with self.subTest(delete_id=delete_id):
+                ok, results, changed = apply_session_operations(self.user, self.operations(delete_id))
+
+                self.assertFalse(ok)
+                self.assertEqual([result['status'] for result in results], ['ok', 'ok', 'error'])
+                self.assertEqual(changed, [])
+                self.session.refresh_from_db()
+                self.assertEqual(self.session.start_time, at(0))
+                self.assertEqual(StudySession.objects.filter(user=self.user).count(), 1)
+
+    def test_rejects_sessions_longer_than_a_day(self):
+        ok, results, _ = apply_session_operations(self.user, [
+            {'op': 'create', 'start': at(2).isoformat(), 'end': at(27).isoformat()},
+        ])
+        self.assertFalse(ok)
+        self.assertEqual(results[0]['message'], 'Sessions can last at most 24 hours')
+
+    def test_accepts_numeric_string_ids(self):
+        doomed = StudySession.objects.create(
+            user=self.user, title='Cancelled', start_time=at(6), end_time=at(7)
+        )
+        ok, results, changed = apply_session_operations(self.user, self.operations(str(doomed.pk)))
+
+        self.assertTrue(ok, results)
+        self.assertEqual(len(changed), 2)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.start_time, at(4))
+        self.assertFalse(StudySession.objects.filter(pk=doomed.pk).exists())
+        self.assertEqual(StudySession.objects.get(pk=results[0]['sessionId']).task, self.task)
+
+
+class DailyLoadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user, timezone='America/New_York')
+
+    def session(self, start, end, **kwargs):
+        return StudySession.objects.create(
+            user=self.user, title='Session', start_time=at(start), end_time=at(end), **kwargs
+        )
+
+    def assertMatchesRecount(self):
+        zone = UserProfile.objects.get(user=self.user).timezone
+        expected = {}
+        sessions = StudySession.objects.filter(user=self.user).values_list('start_time', 'end_time', 'completed')
+        for start, end, completed in sessions:
+            minutes = round((end - start) / timedelta(minutes=1))
+            load = expected.setdefault(local_date(start, zone), [0, 0])
+            load[0] += minutes
+            load[1] += minutes if completed else 0
+        loads = DailyLoad.objects.filter(user=self.user).values_list('date', 'scheduled_minutes', 'completed_minutes')
+        self.assertEqual({date: [scheduled, done] for date, scheduled, done in loads if scheduled or done}, expected)
+
+    def test_save_move_complete_and_delete(self):
+        # 22:00 on 2 March in New York
+        session = self.session(-6, -5)
+        self.assertMatchesRecount()
+        session.start_time, session.end_time = at(14), at(15.5)
+        session.save()
+        self.assertMatchesRecount()
+        session.completed = True
+        session.save()
+        self.assertMatchesRecount()
+        session.delete()
+        self.assertMatchesRecount()
+
+    def test_bulk_created_plans(self):
+        task = Task.objects.create(user=self.user, title='Essay', due_date=at(72), estimated_duration=300)
+        self.session(1, 2)
+        StudyPlannerAlgorithm(self.user, now=T0).generate_schedule()
+        self.assertMatchesRecount()
+        Task.objects.filter(pk=task.pk).update(estimated_duration=600)
+        StudyPlannerAlgorithm(self.user, now=T0).reschedule([task.pk])
+        self.assertMatchesRecount()
+
+    def test_batch_operations(self):
+        moved, doomed = self.session(0, 1), self.session(2, 3)
+        ok, results, _ = apply_session_operations(self.user, [
+            {'op': 'create', 'start': at(14).isoformat(), 'end': at(16).isoformat()},
+            {'op': 'move', 'id': moved.pk, 'start': at(-6).isoformat(), 'end': at(-4).isoformat()},
+            {'op': 'delete', 'id': doomed.pk},
+        ])
+        self.assertTrue(ok, results)
+        self.assertMatchesRecount()
+
+    def test_rebuilt_when_the_time_zone_changes(self):
+        for start in (-6, 0, 14, 20):
+            self.session(start, start + 1, completed=start < 0)
+        profile = UserProfile.objects.get(user=self.user)
+        profile.timezone = 'Asia/Tokyo'
+        profile.save()
+        self.assertMatchesRecount()
+
+
+class OverlapMigrationTests(TestCase):
+    migration = import_module('planner.migrations.0011_session_overlap_constraint')
+
+    def setUp(self):
+        self.user = User.objects.create_user('student')
+        UserProfile.objects.create(user=self.user)
+
+    def session(self, title, start, end, **kwargs):
+        return StudySession.objects.create(
+            user=self.user, title=title, start_time=at(start), end_time=at(end), **kwargs
+        )
+
+    def test_deletes_only_planner_sessions(self):
+        # T0 is the migration's cutoff
+        history = [self.session('Past', -10, -7), self.session('Past inside', -9, -8)]
+        stale_plan = self.session('Stale plan', -6, -5, auto_scheduled=True)
+        logged = self.session('Logged', -6.5, -5.5)
+        first = self.session('First', 1, 4)
+        later = self.session('Later', 2, 5)
+        covering = self.session('Covering', 5.5, 8)
+        covered = self.session('Covered', 6, 7)
+        plan = self.session('Plan', 10, 11, auto_scheduled=True)
+        manual = self.session('Manual', 10.5, 12)
+        done = self.session('Done', 13, 14, auto_scheduled=True, completed=True)
+        after_done = self.session('After done', 13.5, 15)
+        version = UserProfile.objects.get(user=self.user).calendar_version
+
+        # Historical models, which send no signals
+        state = MigrationExecutor(connection).loader.project_state(('planner', '0010_userprofile_timezone'))
+        legacy = self.migration.resolve_overlaps(state.apps, T0)
+
+        remaining = StudySession.objects.filter(user=self.user)
+        # Everything but the planner's open sessions is kept as it was
+        kept = [*history, logged, first, later, covering, covered, manual, done, after_done]
+        self.assertEqual(
+            set(remaining.values_list('pk', 'start_time', 'end_time')),
+            {(session.pk, session.start_time, session.end_time) for session in kept}
+        )
+        self.assertEqual(
+            legacy, sorted(session.pk for session in [first, later, covering, covered, done, after_done])
+        )
+        # What the constraint covers has no overlaps left
+        running = remaining.filter(end_time__gt=T0).exclude(pk__in=legacy).values('id', 'start_time', 'end_time')
+        self.assertEqual(find_conflicts(running), [])
+        minutes = {}
+        for session in remaining:
+            day = session.start_time.date()
+            minutes[day] = minutes.get(day, 0) + (session.end_time - session.start_time) / timedelta(minutes=1)
+        self.assertEqual(
+            dict(DailyLoad.objects.filter(user=self.user).values_list('date', 'scheduled_minutes')), minutes
+        )
+        self.assertEqual(UserProfile.objects.get(user=self.user).calendar_version, version + 1)
@@ -0,0 +1,61 @@
+import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+
+@lru_cache(maxsize=None)
+def get_zone(name):
+    return ZoneInfo(name)
+
+
+@lru_cache(maxsize=1)
+def timezone_choices():
+    return [(name, name.replace('_', ' ')) for name in sorted(available_timezones())]
+
+
+def validate_timezone(name):
+    try:
+        get_zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValidationError(f"Unknown time zone: {name}")
+
+
+def _to_utc(date, time, zone):
+    # Wall times skipped by a DST jump resolve with the offset before it,
+    # landing just after the jump once converted
+    return datetime.datetime.combine(date, time, tzinfo=zone).astimezone(datetime.timezone.utc)
+
+
+@lru_cache(maxsize=8192)
+def day_bounds(zone_name, date):
+    """The UTC instants at which `date` starts and ends in the zone"""
+    zone = get_zone(zone_name)
+    return (
+        _to_utc(date, datetime.time.min, zone),
+        _to_utc(date + datetime.timedelta(days=1), datetime.time.min, zone),
+    )
+
+
+@lru_cache(maxsize=8192)
+def local_window(zone_name, date, start, end):
+    """The UTC instants of the wall clock times `start` and `end` on `date`"""
+    zone = get_zone(zone_name)
+    return _to_utc(date, start, zone), _to_utc(date, end, zone)
+
+
+def local_date(moment, zone_name):
+    return moment.astimezone(get_zone(zone_name)).date()
+
+
+def parse_client_time(value):
+    """Parse an ISO 8601 time sent by a client, in the current time zone if naive.
+
+    Raises ValueError or TypeError for anything else.
+    """
+    moment = datetime.datetime.fromisoformat(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
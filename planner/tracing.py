@@ -0,0 +1,72 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.db import connection
+
+from .metrics import QueryCounter
+
+
+class PlannerTrace:
+    """Wall time, queries and counters for each phase of a planner run.
+
+    Phases that run more than once (for example planning again after
+    displacing sessions) add up.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(counter):
+                yield
+        finally:
+            phase = self.phases.setdefault(name, {'ms': 0.0, 'queries': 0, 'db_ms': 0.0})
+            phase['ms'] += (time.perf_counter() - started) * 1000
+            phase['queries'] += counter.count
+            phase['db_ms'] += counter.seconds * 1000
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            'total_ms': round(sum(phase['ms'] for phase in self.phases.values()), 3),
+            'queries': sum(phase['queries'] for phase in self.phases.values()),
+            'phases': {
+                name: {
+                    'ms': round(phase['ms'], 3),
+                    'queries': phase['queries'],
+                    'db_ms': round(phase['db_ms'], 3),
+                }
+                for name, phase in self.phases.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def format(self):
+        """One line per phase, then the counters"""
+        lines = [
+            f"{name:12} {phase['ms']:9.2f} ms  {phase['queries']:4d} queries  "
+            f"{phase['db_ms']:9.2f} ms in db"
+            for name, phase in self.phases.items()
+        ]
+        lines.append(', '.join(f'{name}={value}' for name, value in self.counters.items()))
+        return '\n'.join(lines)
+
+
+class NullTrace:
+    """Stands in for PlannerTrace when tracing is off"""
+
+    def phase(self, name):
+        return nullcontext()
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_TRACE = NullTrace()
@@ -1,14 +1,41 @@
+import csv
 import json
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, authenticate
+from django.db import IntegrityError, transaction
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import quote_etag
 from datetime import datetime, timedelta
-from .models import Task, Course, StudySession, UserProfile
+from .models import Task, Course, StudySession, UserProfile, ScheduleJob
 from .forms import CustomUserCreationForm, UserProfileForm, TaskForm, CourseForm, StudySessionForm
-from .scheduling_algorithm import StudyPlannerAlgorithm
+from . import calendar_feed, conflicts, session_batch, task_feed, task_transfer
+from .dashboard import aload_dashboard
+from .jobs import JOB_TIMEOUT, enqueue_schedule_job, fail_stale_jobs
+from .metrics import collector
+from .scheduling_algorithm import DEFAULT_STRATEGY, StudyPlannerAlgorithm, get_strategy
+from .timezones import parse_client_time
+
+
+def _get_planner(user):
+    """Return a planner for users with a generated schedule, else None"""
+    if not StudySession.objects.filter(
+        user=user,
+        auto_scheduled=True,
+        completed=False,
+        start_time__gte=timezone.now()
+    ).exists():
+        return None
+    try:
+        return StudyPlannerAlgorithm(user)
+    except UserProfile.DoesNotExist:
+        return None
 
 
 def home(request):
@@ -35,24 +62,10 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 @login_required
-def dashboard(request):
-    upcoming_tasks = Task.objects.filter(
-        user=request.user, 
-        due_date__gte=timezone.now()
-    ).order_by('due_date')[:5]
-    
-    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
-    today_sessions = StudySession.objects.filter(
-        user=request.user,
-        start_time__range=[today_start, today_end]
-    ).order_by('start_time')
-    
-    context = {
-        'upcoming_tasks': upcoming_tasks,
-        'today_sessions': today_sessions,
-    }
-    return render(request, 'dashboard.html', context)
+async def dashboard(request):
+    context = await aload_dashboard(await request.auser())
+    # Context processors read the session and user synchronously
+    return await sync_to_async(render)(request, 'dashboard.html', context)
 
 
 @login_required
@@ -101,6 +114,9 @@ def task_edit(request, pk):
         form = TaskForm(request.user, request.POST, instance=task)
         if form.is_valid():
             form.save()
+            planner = _get_planner(request.user)
+            if planner:
+                planner.reschedule([task.pk])
             messages.success(request, 'Task updated successfully!')
             return redirect('task_list')
     else:
@@ -120,6 +136,77 @@ def task_delete(request, pk):
     return render(request, 'tasks/task_confirm_delete.html', {'task': task})
 
 
+@login_required
+def task_import(request):
+    """Import tasks from an uploaded CSV or iCalendar (.ics) file.
+    
+    CSV files need a header row naming TaskForm's fields, with the course
+    given by code. Valid rows are imported and invalid ones reported. The
+    upload form lives on the task list, which every outcome redirects to.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    upload = request.FILES.get('file')
+    file_format = request.POST.get('format') or (
+        'ics' if upload and upload.name.lower().endswith(('.ics', '.ical')) else 'csv'
+    )
+    wants_json = not request.accepts('text/html')
+    if upload is None or file_format not in ('csv', 'ics'):
+        message = 'Upload a CSV or .ics file'
+        if wants_json:
+            return JsonResponse({'status': 'error', 'message': message}, status=400)
+        messages.error(request, message)
+        return redirect('task_list')
+    
+    zone_name = UserProfile.objects.filter(user=request.user).values_list(
+        'timezone', flat=True
+    ).first() or 'UTC'
+    try:
+        result = task_transfer.import_tasks(
+            request.user, task_transfer.decoded_lines(upload), file_format, zone_name
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        if wants_json:
+            return JsonResponse({'status': 'error', 'message': f'Unreadable file: {e}'}, status=400)
+        messages.error(request, f'Unreadable file: {e}')
+        return redirect('task_list')
+    
+    if wants_json:
+        return JsonResponse({'status': 'success', **result.as_dict()})
+    messages.success(request, f'Imported {result.created} tasks.')
+    if result.error_count:
+        messages.warning(request, f'{result.error_count} rows could not be imported.')
+    return redirect('task_list')
+
+
+@login_required
+async def task_export(request):
+    """Stream the user's tasks or study sessions as CSV or iCalendar"""
+    user = await request.auser()
+    file_format = request.GET.get('format', 'csv')
+    kind = request.GET.get('kind', 'tasks')
+    if file_format == 'ics':
+        content = task_transfer.aiter_ics(
+            user,
+            include_tasks=kind in ('tasks', 'all'),
+            include_sessions=kind in ('sessions', 'all')
+        )
+        content_type = 'text/calendar; charset=utf-8'
+    elif file_format == 'csv' and kind == 'tasks':
+        content = task_transfer.aiter_tasks_csv(user)
+        content_type = 'text/csv; charset=utf-8'
+    elif file_format == 'csv' and kind == 'sessions':
+        content = task_transfer.aiter_sessions_csv(user)
+        content_type = 'text/csv; charset=utf-8'
+    else:
+        return JsonResponse({'status': 'error', 'message': 'Unsupported format or kind'}, status=400)
+    
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{file_format}"'
+    return response
+
+
 @login_required
 def course_list(request):
     courses = Course.objects.filter(user=request.user).order_by('name')
@@ -171,65 +258,132 @@ def calendar_view(request):
 
 
 @login_required
-def calendar_events(request):
+async def calendar_events(request):
+    """Events in a date range for FullCalendar.
+    
+    The ETag is the user's calendar version, which changes whenever their
+    data does, so conditional requests cost a single query.
+    """
+    user = await request.auser()
+    version = await calendar_feed.aget_calendar_version(user)
+    etag = quote_etag(f'{user.pk}-{version}') if version is not None else None
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = await _calendar_events(request, user, version)
+    if etag and request.method in ('GET', 'HEAD'):
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+async def _calendar_events(request, user, version):
     start = request.GET.get('start')
     end = request.GET.get('end')
     start_date = datetime.fromisoformat(start)
     end_date = datetime.fromisoformat(end)
-    sessions = StudySession.objects.filter(
-        user=request.user,
-        start_time__gte=start_date,
-        end_time__lte=end_date
-    )
     
-    events = []
-    for session in sessions:
-        color = session.course.color if session.course else '#3b82f6'
-        events.append({
-            'id': session.id,
-            'title': session.title,
-            'start': session.start_time.isoformat(),
-            'end': session.end_time.isoformat(),
-            'color': color,
-            'extendedProps': {
-                'type': 'study_session',
-                'task': session.task.title if session.task else 'General Study',
-                'course': session.course.name if session.course else 'No Course',
-            }
-        })
-    
-    tasks = Task.objects.filter(
-        user=request.user,
-        due_date__gte=start_date,
-        due_date__lte=end_date
-    )
+    try:
+        fields = calendar_feed.parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    compact = request.GET.get('format') == 'compact'
     
-    for task in tasks:
-        events.append({
-            'id': f'task-{task.id}',
-            'title': f'Due: {task.title}',
-            'start': task.due_date.isoformat(),
-            'allDay': True,
-            'color': '#ef4444',
-            'extendedProps': {
-                'type': 'task_due',
-            }
-        })
+    key = None
+    if version is not None:
+        key = calendar_feed.cache_key(user, version, request.GET)
+        content = await calendar_feed.aget_cached_response(key)
+        if content is not None:
+            return HttpResponse(content, content_type='application/json')
     
-    return JsonResponse(events, safe=False)
+    events = await calendar_feed.aserialize_events(user, start_date, end_date, fields, compact)
+    response = JsonResponse(events, safe=False)
+    if key:
+        await calendar_feed.aset_cached_response(key, response.content)
+    return response
 
 
 @login_required
 def generate_schedule(request):
     if request.method == 'POST':
-        planner = StudyPlannerAlgorithm(request.user)
-        study_sessions = planner.generate_schedule(days=7)
-        messages.success(request, f'Schedule generated with {len(study_sessions)} study sessions!')
+        strategy = request.POST.get('strategy', DEFAULT_STRATEGY)
+        try:
+            get_strategy(strategy)
+        except ValueError as e:
+            if request.accepts('text/html'):
+                messages.error(request, str(e))
+                return redirect('dashboard')
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        
+        job = enqueue_schedule_job(request.user, strategy=strategy, days=7)
+        if not request.accepts('text/html'):
+            return JsonResponse({'status': job.status, 'jobId': job.id}, status=202)
+        messages.success(request, 'Your schedule is being generated and will appear on the calendar shortly.')
         return redirect('calendar')
     
     return redirect('dashboard')
 
 
+@login_required
+def api_schedule_job(request, pk):
+    job = get_object_or_404(ScheduleJob, pk=pk, user=request.user)
+    if job.status == 'running' and job.started_at < timezone.now() - JOB_TIMEOUT:
+        fail_stale_jobs()
+        job.refresh_from_db()
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'sessionCount': job.session_count,
+        'error': job.error or None,
+        'trace': job.trace,
+        'createdAt': job.created_at.isoformat(),
+        'finishedAt': job.finished_at.isoformat() if job.finished_at else None,
+    })
+
+
+def _conflict_response(session):
+    """An error response if `session` is empty, too long or overlaps a
+    session the planner cannot move, else None"""
+    if session.end_time <= session.start_time:
+        return JsonResponse({'status': 'error', 'message': 'End must be after start'}, status=400)
+    if session.end_time - session.start_time > conflicts.MAX_SESSION_LENGTH:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Sessions can last at most 24 hours'}, status=400
+        )
+    now = timezone.now()
+    blocking = [
+        other['id']
+        for other in conflicts.overlapping_sessions(
+            session.user, session.start_time, session.end_time, [session.pk] if session.pk else []
+        )
+        if not conflicts.is_replaceable(other, now)
+    ]
+    if blocking:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Overlaps another study session',
+            'conflicts': blocking,
+        }, status=409)
+    return None
+
+
+def _save_and_replan(session):
+    """Save a session the user placed and move planned sessions out of its way.
+    
+    Both happen in one transaction, which the overlap constraint on
+    PostgreSQL checks as a whole when it commits.
+    """
+    try:
+        with transaction.atomic():
+            session.save()
+            planner = _get_planner(session.user)
+            if planner:
+                planner.reschedule_around(session)
+    except IntegrityError:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Overlaps another study session'}, status=409
+        )
+    return None
+
+
 @login_required
 def api_study_sessions(request):
     if request.method == 'POST':
@@ -238,8 +392,8 @@ def api_study_sessions(request):
         session = StudySession(
             user=request.user,
             title=data.get('title', 'Study Session'),
-            start_time=datetime.fromisoformat(data['start']),
-            end_time=datetime.fromisoformat(data['end']),
+            start_time=parse_client_time(data['start']),
+            end_time=parse_client_time(data['end']),
         )
         
         if 'taskId' in data:
@@ -253,9 +407,10 @@ def api_study_sessions(request):
                 session.course = Course.objects.get(id=data['courseId'], user=request.user)
             except Course.DoesNotExist:
                 pass
-                
-        session.save()
         
+        error = _conflict_response(session) or _save_and_replan(session)
+        if error:
+            return error
         return JsonResponse({'status': 'success', 'sessionId': session.id})
     
     elif request.method == 'PUT':
@@ -264,9 +419,13 @@ def api_study_sessions(request):
         
         try:
             session = StudySession.objects.get(id=session_id, user=request.user)
-            session.start_time = datetime.fromisoformat(data['start'])
-            session.end_time = datetime.fromisoformat(data['end'])
-            session.save()
+            session.start_time = parse_client_time(data['start'])
+            session.end_time = parse_client_time(data['end'])
+            # A session the user placed by hand is kept by later regenerations
+            session.auto_scheduled = False
+            error = _conflict_response(session) or _save_and_replan(session)
+            if error:
+                return error
             
             return JsonResponse({'status': 'success'})
         except StudySession.DoesNotExist:
@@ -287,8 +446,68 @@ def api_study_sessions(request):
     return JsonResponse({'status': 'error'}, status=400)
 
 
-def api_upcoming_tasks(request):
-    """API endpoint for Java notification service to get upcoming tasks"""
+@login_required
+def api_study_sessions_batch(request):
+    """Apply many session creates, moves and deletes in one request.
+    
+    Takes `{"operations": [...]}` where each operation is one of
+    `{"op": "create", "start", "end", "title"?, "taskId"?, "courseId"?}`,
+    `{"op": "move", "id", "start", "end"}` or `{"op": "delete", "id"}`,
+    optionally with a `clientId` echoed back. Either every operation is
+    applied or, if any is invalid or overlaps a session the planner cannot
+    move, none is.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+    try:
+        operations = json.loads(request.body).get('operations')
+    except (ValueError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+    
+    try:
+        with transaction.atomic():
+            ok, results, changed = session_batch.apply_session_operations(request.user, operations)
+            if changed:
+                planner = _get_planner(request.user)
+                if planner:
+                    planner.reschedule_around_sessions(changed)
+    except session_batch.BatchError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except IntegrityError:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Overlaps another study session'}, status=409
+        )
+    if not ok:
+        return JsonResponse({'status': 'error', 'results': results}, status=400)
+    return JsonResponse({'status': 'success', 'results': results})
+
+
+@login_required
+def api_session_conflicts(request):
+    """Every pair of the user's overlapping sessions between `start` and `end`"""
+    try:
+        start = parse_client_time(request.GET['start'])
+        end = parse_client_time(request.GET['end'])
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'start and end are required'}, status=400)
+    
+    return JsonResponse({
+        'conflicts': [
+            {'a': first, 'b': second, 'start': start.isoformat(), 'end': end.isoformat()}
+            for first, second, start, end in conflicts.session_conflicts(request.user, start, end)
+        ],
+    })
+
+
+async def api_upcoming_tasks(request):
+    """API endpoint for Java notification service to get upcoming tasks.
+    
+    Streams NDJSON when asked for with `Accept: application/x-ndjson` or
+    `format=ndjson`, otherwise a JSON array. With `limit` the result is one
+    keyset page and the `X-Next-Cursor` header holds the `after` value for
+    the next page. `X-Sync-Cursor` can be passed back as `since` to fetch
+    only what changed afterwards.
+    """
     if request.method != 'GET':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
     
@@ -297,25 +516,83 @@ def api_upcoming_tasks(request):
         return JsonResponse({'error': 'Unauthorized'}, status=401)
     token = auth_token.split(' ')[1]
     start_date = timezone.now()
-    end_date = start_date + timedelta(days=7)
-    
-    tasks = Task.objects.filter(
-        due_date__range=[start_date, end_date],
-        status__in=['pending', 'in_progress']
-    ).select_related('course', 'user')
-    
-    task_list = []
-    for task in tasks:
-        task_list.append({
-            'id': task.id,
-            'title': task.title,
-            'due_date': task.due_date.isoformat(),
-            'priority': task.priority,
-            'user_email': task.user.email,
-            'course': task.course.name if task.course else None
-        })
-    
-    return JsonResponse(task_list, safe=False)
+    end_date = start_date + task_feed.UPCOMING_WINDOW
+    
+    if request.GET.get('since'):
+        return await sync_to_async(_upcoming_tasks_delta)(request, start_date)
+    
+    try:
+        after = task_feed.decode_cursor(request.GET['after']) if request.GET.get('after') else None
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    if limit is not None and not 0 < limit <= task_feed.MAX_PAGE_SIZE:
+        return JsonResponse(
+            {'error': f'limit must be between 1 and {task_feed.MAX_PAGE_SIZE}'}, status=400
+        )
+    
+    ndjson = (
+        request.GET.get('format') == 'ndjson'
+        or 'application/x-ndjson' in request.headers.get('Accept', '')
+    )
+    content_type = 'application/x-ndjson' if ndjson else 'application/json'
+    next_cursor = None
+    if limit is None:
+        rows = task_feed.aupcoming_tasks(start_date, end_date, after)
+        content = task_feed.aiter_ndjson(rows) if ndjson else task_feed.aiter_json_array(rows)
+        response = StreamingHttpResponse(content, content_type=content_type)
+    else:
+        # A page is bounded by limit, so it can be fetched up front
+        tasks = task_feed.upcoming_tasks(start_date, end_date, after)[:limit]
+        rows = [row async for row in tasks]
+        if len(rows) == limit:
+            next_cursor = task_feed.encode_cursor(rows[-1][2], rows[-1][0])
+        content = task_feed.iter_ndjson(rows) if ndjson else task_feed.iter_json_array(rows)
+        response = HttpResponse(''.join(content), content_type=content_type)
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    response['X-Sync-Cursor'] = task_feed.encode_sync_cursor(start_date)
+    return response
+
+
+def _upcoming_tasks_delta(request, now):
+    """Changes since a sync cursor: tasks touched in any way, tasks that
+    entered the upcoming window since then, plus deletions.
+    
+    Changed tasks carry their status and due date so clients can drop the
+    ones that were completed or moved out of the upcoming window.
+    """
+    try:
+        since = task_feed.decode_sync_cursor(request.GET['since'])
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    if since < now - task_feed.TOMBSTONE_RETENTION:
+        return JsonResponse({'error': 'Cursor expired, sync again without since'}, status=410)
+    
+    task_feed.prune_tombstones(now)
+    changes = [task_feed.serialize_change(row) for row in task_feed.changed_tasks(since, now)]
+    return JsonResponse({
+        'cursor': task_feed.encode_sync_cursor(now),
+        'tasks': changes,
+        'deleted': task_feed.deleted_task_ids(since),
+    })
+
+
+def metrics(request):
+    """Request metrics in the Prometheus text format.
+    
+    Open to staff users, and to scrapers sending `Authorization: Bearer
+    <METRICS_TOKEN>` when that setting is configured.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    auth_header = request.headers.get('Authorization', '')
+    authorized = request.user.is_staff or bool(
+        token and auth_header.startswith('Bearer ')
+        and constant_time_compare(auth_header[len('Bearer '):], token)
+    )
+    if not authorized:
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(collector.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 def custom_logout(request):
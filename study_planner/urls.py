@@ -19,6 +19,8 @@ urlpatterns = [
         path('tasks/', include([
         path('', views.task_list, name='task_list'),
         path('create/', views.task_create, name='task_create'),
+        path('import/', views.task_import, name='task_import'),
+        path('export/', views.task_export, name='task_export'),
         path('<int:pk>/edit/', views.task_edit, name='task_edit'),
         path('<int:pk>/delete/', views.task_delete, name='task_delete'),
     ])),
@@ -34,7 +36,12 @@ urlpatterns = [
     path('calendar/events/', views.calendar_events, name='calendar_events'),
     path('generate-schedule/', views.generate_schedule, name='generate_schedule'),
     path('api/study-sessions/', views.api_study_sessions, name='api_study_sessions'),
+    path('api/study-sessions/batch/', views.api_study_sessions_batch, name='api_study_sessions_batch'),
+    path('api/study-sessions/conflicts/', views.api_session_conflicts, name='api_session_conflicts'),
+    path('api/schedule-jobs/<int:pk>/', views.api_schedule_job, name='api_schedule_job'),
     
     # API endpoints for Java notification service
     path('api/upcoming-tasks/', views.api_upcoming_tasks, name='api_upcoming_tasks'),
+    
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file